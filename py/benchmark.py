@@ -0,0 +1,278 @@
+import argparse
+import time
+
+import numpy as np
+
+
+def _fresh_storage(**kwargs):
+    from neuronalMemory.neuronalMemory import NeuralStorage
+    # NeuralStorage is a process singleton, drop it so every case starts from new weights
+    NeuralStorage._instance = None
+    return NeuralStorage(**kwargs)
+
+
+def _timeit(func, repeat):
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_graph_mode(repeat=200):
+    """
+    Per-step cost of train_step and inference, eager vs graph vs graph+XLA.
+    """
+    data = np.random.randint(0, 256, size=1024, dtype=np.uint8).tobytes()
+    cases = [("eager", {}), ("graph", {"graph_mode": True}),
+             ("graph+xla", {"graph_mode": True, "jit_compile": True})]
+    print(f"{'mode':<12}{'train_step ms':>16}{'infer ms':>12}")
+    for name, kwargs in cases:
+        storage = _fresh_storage(**kwargs)
+        x = storage.preprocess_data(data)
+        train_s = _timeit(lambda: storage.train_step(x), repeat)
+        infer_s = _timeit(lambda: storage.infer(x), repeat)
+        print(f"{name:<12}{train_s * 1e3:>16.3f}{infer_s * 1e3:>12.3f}")
+
+
+def bench_preprocess(items=1000, repeat=20):
+    """
+    Preprocessing cost per 1k mixed payloads (bytes, str, uint8 and float
+    arrays of varying length): the former per-item astype/divide/np.pad and
+    tensor conversion, preprocess_data per item, and preprocess_batch into
+    a preallocated buffer.
+    """
+    import tensorflow as tf
+    storage = _fresh_storage()
+    size = storage.input_size
+    rng = np.random.default_rng(0)
+    datas = []
+    for i in range(items):
+        values = rng.integers(0, 256, int(rng.integers(size // 2, size * 2)), dtype=np.uint8)
+        datas.append([values.tobytes(), values.tobytes().decode('latin-1'), values,
+                      values.astype(np.float32) / 255.0][i % 4])
+
+    def per_item_old():
+        rows = []
+        for data in datas:
+            if isinstance(data, str):
+                data = np.frombuffer(data.encode('utf-8'), dtype=np.uint8)
+            elif isinstance(data, bytes):
+                data = np.frombuffer(data, dtype=np.uint8)
+            data = data.astype(np.float32) / 255.0
+            if data.size < size:
+                data = np.pad(data, (0, size - data.size), 'constant')
+            rows.append(tf.convert_to_tensor(data[:size].reshape(1, -1), dtype=tf.float32))
+        return tf.concat(rows, axis=0)
+
+    out = np.empty((items, size), dtype=np.float32)
+    cases = [("per item (old)", per_item_old),
+             ("preprocess_data", lambda: tf.concat([storage.preprocess_data(data) for data in datas], axis=0)),
+             ("preprocess_batch", lambda: storage.preprocess_batch(datas, out))]
+    print(f"{'path':<20}{'ms per 1k items':>16}")
+    for name, func in cases:
+        print(f"{name:<20}{_timeit(func, repeat) * 1e3 * 1000 / items:>16.2f}")
+
+
+def bench_quantized_inference(items=64, epochs=300, repeat=50):
+    """
+    Reconstruction through TF against NumPy exports of the weights in each
+    precision: saved and resident weight KiB, ms per single row and per
+    batch of items rows, and the byte match rate of the uint8 outputs with
+    the input (as in the neuronalMemory demo) and with the TF output.
+    """
+    from neuronalMemory.inference import PRECISIONS
+    storage = _fresh_storage()
+    rng = np.random.default_rng(0)
+    # repeating byte ramps, something the autoencoder can actually learn
+    datas = [np.tile(np.arange(start, start + 16, dtype=np.uint8), 64) for start in rng.integers(0, 240, items)]
+    x = storage.preprocess_batch(datas)
+    storage.train(x, epochs=epochs)
+    expected = (x * 255).astype(np.uint8)
+    reference = (np.asarray(storage.infer(x)) * 255).astype(np.uint8)
+
+    def report(name, run, saved, resident):
+        output = (np.asarray(run(x)) * 255).astype(np.uint8)
+        single = _timeit(lambda: run(x[:1]), repeat)
+        batched = _timeit(lambda: run(x), repeat)
+        print(f"{name:<10}{saved / 1024:>10.0f}{resident / 1024:>10.0f}{single * 1e3:>10.3f}"
+              f"{batched * 1e3:>12.3f}{np.mean(output == expected):>12.4f}{np.mean(output == reference):>12.4f}")
+
+    print(f"{'weights':<10}{'saved KiB':>10}{'RAM KiB':>10}{'1 row ms':>10}{f'{items} rows ms':>12}"
+          f"{'vs input':>12}{'vs tf':>12}")
+    weights_bytes = sum(w.nbytes for w in storage.get_weights())
+    report("tf", storage.infer, weights_bytes, weights_bytes)
+    for precision in PRECISIONS:
+        model = storage.export_inference(precision)
+        report(precision, model, model.nbytes(), model.resident_bytes())
+
+
+def bench_replica_startup():
+    """
+    Cold start to a first retrieve in a fresh process: NeuralStorage reopening
+    a checkpoint against a ReadReplica of it, wall time and peak RSS.
+    """
+    import subprocess
+    import sys
+    import tempfile
+    persist_dir = tempfile.mkdtemp()
+    storage = _fresh_storage(persist_dir=persist_dir, batch_epochs=5)
+    storage.store_many(range(64), [np.random.default_rng(i).integers(0, 256, 1024, dtype=np.uint8) for i in range(64)])
+    storage.checkpoint()
+    cases = [("NeuralStorage", "from neuronalMemory.neuronalMemory import NeuralStorage; "
+                               f"storage = NeuralStorage(persist_dir={persist_dir!r})"),
+             ("ReadReplica", "from neuronalMemory.replica import ReadReplica; "
+                             f"storage = ReadReplica({persist_dir!r})")]
+    print(f"{'runtime':<16}{'startup s':>10}{'peak RSS MiB':>14}")
+    for name, setup in cases:
+        # VmHWM, unlike ru_maxrss, is not inherited from the forking parent
+        code = ("import sys, time; start = time.perf_counter(); sys.path.insert(0, '.'); "
+                f"{setup}; storage.retrieve(0); elapsed = time.perf_counter() - start; "
+                "peak = [line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM')][0]; "
+                "print(elapsed, peak)")
+        seconds, rss_kib = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                          check=True).stdout.split()[-2:]
+        print(f"{name:<16}{float(seconds):>10.2f}{int(rss_kib) / 1024:>14.0f}")
+
+
+def _filled_ring(entries, width=512, dtype=np.int8, scale=1.0 / 127.0):
+    from neuronalMemory.ringBuffer import RingBuffer
+    ring = RingBuffer(entries, width, dtype, scale)
+    rng = np.random.default_rng(0)
+    for start in range(0, entries, 10000):
+        block = rng.integers(-127, 128, size=(min(10000, entries - start), width)).astype(dtype)
+        for offset, row in enumerate(block):
+            ring.put(start + offset, row)
+    return ring
+
+
+def bench_query_similar(sizes=(12_000, 100_000, 1_000_000), batch=16, k=10, repeat=3):
+    """
+    Exact top-k search over int8 latent rows, single and batched queries.
+    """
+    print(f"{'entries':>10}{'metric':>8}{'1 query ms':>14}{f'{batch} queries ms':>18}")
+    rng = np.random.default_rng(1)
+    for entries in sizes:
+        ring = _filled_ring(entries)
+        queries = rng.uniform(-1, 1, size=(batch, ring.width)).astype(np.float32)
+        for metric in ("mse", "cosine"):
+            single = _timeit(lambda: ring.search(queries[:1], k, metric), repeat)
+            batched = _timeit(lambda: ring.search(queries, k, metric), repeat)
+            print(f"{entries:>10}{metric:>8}{single * 1e3:>14.2f}{batched * 1e3:>18.2f}")
+
+
+def bench_ann(entries=100_000, width=512, n_lists=256, queries=200, k=10):
+    """
+    Recall@k and queries/s of the IVF index against exact search, on
+    clustered int8 rows shaped like tanh encodings.
+    """
+    from neuronalMemory.ivfIndex import IVFIndex
+    from neuronalMemory.ringBuffer import RingBuffer
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(-0.8, 0.8, size=(1000, width))
+    ring = RingBuffer(entries, width, np.int8, 1.0 / 127.0)
+    for key in range(entries):
+        row = np.clip(centers[key % len(centers)] + rng.normal(0, 0.15, width), -1, 1)
+        ring.put(key, np.round(row * 127))
+    index = IVFIndex(ring, n_lists=n_lists)
+    start = time.perf_counter()
+    index.train()
+    print(f"trained {n_lists} lists on {entries} rows in {time.perf_counter() - start:.2f}s")
+
+    picked = rng.choice(entries, size=queries, replace=False)
+    probe = ring.gather(picked) + rng.normal(0, 0.05, (queries, width)).astype(np.float32)
+    start = time.perf_counter()
+    exact, _ = ring.search(probe, k)
+    print(f"{'exact':<10}{'recall@' + str(k):>12}{1.0:>8.3f}{'qps':>6}{queries / (time.perf_counter() - start):>10.1f}")
+    for n_probe in (1, 4, 8, 16, 32):
+        start = time.perf_counter()
+        approx, _ = index.search(probe, k, n_probe=n_probe)
+        qps = queries / (time.perf_counter() - start)
+        recall = np.mean([len(np.intersect1d(a, e)) / k for a, e in zip(approx, exact)])
+        print(f"{'probe=' + str(n_probe):<10}{'recall@' + str(k):>12}{recall:>8.3f}{'qps':>6}{qps:>10.1f}")
+
+
+def bench_transport(size=1024, repeat=2000):
+    """
+    Decoding one tensor body, JSON NetTensor vs raw buffer vs .npy.
+    """
+    import io
+    import json
+    from remote.binaryTensor import decode_npy, decode_raw
+    from remote.netTensor import NetTensor
+    tensor = np.random.default_rng(0).random(size, dtype=np.float32)
+    json_body = json.dumps({"shape": [size], "data": tensor.tolist()}).encode()
+    raw_body = tensor.tobytes()
+    npy_stream = io.BytesIO()
+    np.save(npy_stream, tensor)
+    npy_body = npy_stream.getvalue()
+    cases = [
+        ("json", len(json_body),
+         lambda: NetTensor.model_validate_json(json_body).as_array()),
+        ("raw", len(raw_body), lambda: decode_raw(raw_body, str(size), "float32")),
+        ("npy", len(npy_body), lambda: decode_npy(npy_body)),
+    ]
+    print(f"{'format':<8}{'bytes':>10}{'decode us':>12}")
+    for name, nbytes, decode in cases:
+        print(f"{name:<8}{nbytes:>10}{_timeit(decode, repeat) * 1e6:>12.1f}")
+
+
+def bench_ingest_load(concurrency=32, seconds=5.0):
+    """
+    Sustained POST /reduction/save/binary against the ASGI app in process:
+    requests/s, latency percentiles and how many were answered 429.
+    """
+    import asyncio
+    import httpx
+    from main import app
+    from neuronalMemory.task import TaskQueue
+
+    _fresh_storage(graph_mode=True)
+    body = np.random.default_rng(0).integers(0, 256, 1024, dtype=np.uint8).tobytes()
+    headers = {"content-type": "application/octet-stream", "X-Tensor-Shape": "1024", "X-Tensor-Dtype": "uint8"}
+    latencies = []
+    statuses = {}
+    elapsed = []
+
+    async def client(client_id, http, deadline):
+        key = client_id << 32
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await http.post("/reduction/save/binary", params={"key": key}, content=body, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            key += 1
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+                start = time.perf_counter()
+                await asyncio.gather(*(client(i, http, start + seconds) for i in range(concurrency)))
+                elapsed.append(time.perf_counter() - start)
+            # drop the backlog rather than train through it on the way out
+            await TaskQueue().shutdown(drain=False)
+
+    asyncio.run(run())
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+    print(f"{len(latencies) / elapsed[0]:.0f} req/s over {elapsed[0]:.1f}s with {concurrency} clients, "
+          f"p50 {p50:.2f} ms, p99 {p99:.2f} ms, status counts {statuses}")
+
+
+BENCHMARKS = {
+    "graph_mode": bench_graph_mode,
+    "preprocess": bench_preprocess,
+    "quantized_inference": bench_quantized_inference,
+    "replica_startup": bench_replica_startup,
+    "query_similar": bench_query_similar,
+    "ann": bench_ann,
+    "transport": bench_transport,
+    "ingest_load": bench_ingest_load,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*", help=f"any of {', '.join(BENCHMARKS)}, default all")
+    for name in parser.parse_args().names or BENCHMARKS:
+        print(f"== {name}")
+        BENCHMARKS[name]()
@@ -3,9 +3,9 @@ from concurrent import futures
 
 from rpc import Algorithm_pb2_grpc, Algorithm_pb2
 
-class AlgorithmImpl(Algorithm_pb2_grpc.Algorithm):
+class AlgorithmImpl(Algorithm_pb2_grpc.AlgorithmServicer):
     def Echo(self, request, context):
-        return Algorithm_pb2.EchoMsg(output='ecoh: ' + request.input)
+        return Algorithm_pb2.OutputMsg(message='ecoh: ' + request.message)
 
 
 def serve():
@@ -1,11 +1,51 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 import uvicorn
-from remote.router import rRouter
+from neuronalMemory.neuronalMemory import NeuralStorage
+from neuronalMemory.shard import ShardedStorage
+from neuronalMemory.task import TaskQueue
+from remote.router import rRouter, set_storage
+from util.metrics import registry
+
+# ingest pipeline: training runs on one executor thread so the loop stays free,
+# a full queue is answered with 429 instead of silently dropping writes
+INGEST_QUEUE_SIZE = 1024
+INGEST_WORKERS = 1
+# above 1, keys are spread over this many storage processes
+STORAGE_SHARDS = 1
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sharded = None
+    if STORAGE_SHARDS > 1:
+        sharded = ShardedStorage(shards=STORAGE_SHARDS)
+        set_storage(sharded)
+    else:
+        NeuralStorage()
+    # one worker per shard so the shard processes train in parallel
+    task_queue = TaskQueue(max_size=INGEST_QUEUE_SIZE, workers=max(INGEST_WORKERS, STORAGE_SHARDS), executor='thread',
+                           overflow='reject')
+    await task_queue.start()
+    yield
+    await task_queue.shutdown(drain=True)
+    if sharded is not None:
+        set_storage(None)
+        sharded.close()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(rRouter, tags=["tensor"])
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return registry.render()
+
+
 class AppRunner:
     def __init__(self, host='0.0.0.0', port=12000):
         self.host = host
@@ -0,0 +1,37 @@
+import hashlib
+import os
+import uuid
+
+import numpy as np
+
+from neuronalMemory.ringBuffer import decode_key, encode_key
+
+
+def chunk_key(key, index):
+    """
+    Memory key of chunk index (from 1, chunk 0 is key itself) of a chunked key.
+    """
+    digest = hashlib.blake2b(f"{key!r}#{index}".encode('utf-8'), digest_size=16).digest()
+    return uuid.UUID(bytes=digest)
+
+
+def chunk_keys(key, length, chunk_size):
+    count = -(-length // chunk_size)
+    return [key] + [chunk_key(key, index) for index in range(1, count)]
+
+
+def save_manifests(path, manifests):
+    """
+    Writes {key: payload length} to the .npz at path, replacing it atomically.
+    """
+    tmp_path = f"{path[:-len('.npz')]}.tmp.npz"
+    keys = np.array([encode_key(key) for key in manifests], dtype=np.uint8).reshape(-1, len(encode_key(0)))
+    np.savez(tmp_path, keys=keys, lengths=np.array(list(manifests.values()), dtype=np.int64))
+    os.replace(tmp_path, path)
+
+
+def load_manifests(path):
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as saved:
+        return {decode_key(record): int(length) for record, length in zip(saved['keys'], saved['lengths'])}
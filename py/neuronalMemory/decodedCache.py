@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+from util.metrics import registry
+
+_hits = registry.counter("neuralstorage_cache_hits_total", "Retrieves served from the decoded cache")
+_misses = registry.counter("neuralstorage_cache_misses_total", "Retrieves that had to be decoded")
+
+
+class DecodedCache:
+    """
+    Size-bounded LRU of decoded outputs keyed by (key, weights version).
+    Entries of an older version can never hit again, so the whole cache is
+    dropped the first time a newer version is written.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            value = self.entries.get((key, version))
+            if value is None:
+                self.misses += 1
+                _misses.inc()
+                return None
+            self.entries.move_to_end((key, version))
+            self.hits += 1
+            _hits.inc()
+            return value
+
+    def put(self, key, version, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if self.version is not None and version < self.version:
+                return  # decoded with weights that were replaced meanwhile
+            if version != self.version:
+                self._clear()
+                self.version = version
+            previous = self.entries.pop((key, version), None)
+            if previous is not None:
+                self.nbytes -= len(previous)
+            self.entries[(key, version)] = value
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            value = self.entries.pop((key, self.version), None)
+            if value is not None:
+                self.nbytes -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "bytes": self.nbytes}
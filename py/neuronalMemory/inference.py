@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+
+# weight formats of an exported model; NumPy has no fast half or int8 GEMM, so
+# weights are kept in the chosen format for saving and dequantized once to
+# float32 for BLAS: the format changes accuracy and file size, not speed or RAM
+PRECISIONS = ('float32', 'float16', 'bfloat16', 'int8')
+
+
+def _sigmoid(x):
+    with np.errstate(over='ignore'):
+        np.exp(np.negative(x, out=x), out=x)
+    x += 1.0
+    return np.reciprocal(x, out=x)
+
+
+# activations applied in place on the float32 pre-activation
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0.0, out=x),
+    'tanh': lambda x: np.tanh(x, out=x),
+    'sigmoid': _sigmoid,
+}
+
+
+def quantize(kernel, precision):
+    """
+    Encodes a float32 kernel in precision: (values, scale) where scale is a
+    per-output-column float32 array for int8 and None otherwise.
+    """
+    kernel = np.asarray(kernel, dtype=np.float32)
+    if precision == 'float32':
+        return kernel, None
+    if precision == 'float16':
+        return kernel.astype(np.float16), None
+    if precision == 'bfloat16':
+        # upper 16 bits of the float32, rounded to nearest even
+        bits = kernel.view(np.uint32)
+        rounded = bits + np.uint32(0x7FFF) + ((bits >> np.uint32(16)) & np.uint32(1))
+        return (rounded >> np.uint32(16)).astype(np.uint16), None
+    if precision == 'int8':
+        # symmetric, one scale per output unit
+        scale = np.abs(kernel).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        return np.round(kernel / scale).astype(np.int8), scale.astype(np.float32)
+    raise ValueError(f"Unsupported precision: {precision}")
+
+
+def dequantize(values, scale, precision):
+    if precision == 'bfloat16':
+        return (values.astype(np.uint32) << np.uint32(16)).view(np.float32)
+    kernel = values.astype(np.float32, copy=False)
+    if precision == 'int8':
+        kernel *= scale
+    return kernel
+
+
+class InferenceModel:
+    """
+    Inference-only copy of a NeuralStorage encoder and decoder: each stack is
+    a list of (kernel, bias, activation) dense layers evaluated with NumPy
+    matmuls, dropout being an identity at inference. Kernels are stored in
+    precision but always evaluated as float32 copies, so precision only
+    trades accuracy for a smaller saved model (nbytes): compute is float32
+    and resident memory is the float32 kernels plus the stored ones
+    (resident_bytes), more than a float32 export needs.
+
+    Only NumPy is imported here, a model saved to .npz is loaded and run
+    without TensorFlow. metadata holds the scalars saved along with it.
+    """
+
+    def __init__(self, encoder_layers, decoder_layers, precision='float32', metadata=None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unsupported precision: {precision}")
+        self.precision = precision
+        self._build([self._layer(*layer) for layer in encoder_layers],
+                    [self._layer(*layer) for layer in decoder_layers], metadata)
+
+    def _build(self, encoder_layers, decoder_layers, metadata):
+        self.encoder_layers = encoder_layers
+        self.decoder_layers = decoder_layers
+        self.metadata = dict(metadata or {})
+        self._encoder = [self._runtime(layer) for layer in self.encoder_layers]
+        self._decoder = [self._runtime(layer) for layer in self.decoder_layers]
+
+    def _layer(self, kernel, bias, activation):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {activation}")
+        values, scale = quantize(kernel, self.precision)
+        return values, scale, np.asarray(bias, dtype=np.float32), activation
+
+    def _runtime(self, layer):
+        values, scale, bias, activation = layer
+        return np.ascontiguousarray(dequantize(values, scale, self.precision)), bias, ACTIVATIONS[activation]
+
+    @classmethod
+    def from_storage(cls, storage, precision='float32', metadata=None):
+        """
+        Snapshots the Dense layers of storage.encoder and storage.decoder.
+        """
+        def dense_layers(stack):
+            return [(layer.kernel.numpy(), layer.bias.numpy(), layer.activation.__name__)
+                    for layer in stack.layers if hasattr(layer, 'kernel')]
+        return cls(dense_layers(storage.encoder), dense_layers(storage.decoder), precision, metadata)
+
+    def save(self, path):
+        """
+        Writes the weights, still in precision, and the metadata to the .npz
+        at path, replacing it atomically.
+        """
+        arrays = {'precision': np.array(self.precision)}
+        for stack, layers in (('encoder', self.encoder_layers), ('decoder', self.decoder_layers)):
+            arrays[f'{stack}_layers'] = np.array(len(layers))
+            for i, (values, scale, bias, activation) in enumerate(layers):
+                arrays[f'{stack}{i}_values'] = values
+                arrays[f'{stack}{i}_bias'] = bias
+                arrays[f'{stack}{i}_activation'] = np.array(activation)
+                if scale is not None:
+                    arrays[f'{stack}{i}_scale'] = scale
+        for name, value in self.metadata.items():
+            arrays[f'meta_{name}'] = np.array(value)
+        tmp_path = f"{path[:-len('.npz')]}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            def layers(stack):
+                return [(saved[f'{stack}{i}_values'],
+                         saved[f'{stack}{i}_scale'] if f'{stack}{i}_scale' in saved.files else None,
+                         saved[f'{stack}{i}_bias'], str(saved[f'{stack}{i}_activation']))
+                        for i in range(int(saved[f'{stack}_layers']))]
+            model = cls.__new__(cls)
+            model.precision = str(saved['precision'])
+            metadata = {name[len('meta_'):]: saved[name].item() for name in saved.files if name.startswith('meta_')}
+            model._build(layers('encoder'), layers('decoder'), metadata)
+        return model
+
+    @staticmethod
+    def _run(layers, x):
+        x = np.asarray(x, dtype=np.float32)
+        for kernel, bias, activation in layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+    def encode(self, x):
+        return self._run(self._encoder, x)
+
+    def decode(self, z):
+        return self._run(self._decoder, z)
+
+    def __call__(self, x):
+        return self.decode(self.encode(x))
+
+    def nbytes(self):
+        """
+        Size of the stored weights in precision, biases and scales included,
+        what save writes.
+        """
+        return sum(values.nbytes + bias.nbytes + (scale.nbytes if scale is not None else 0)
+                   for values, scale, bias, _ in self.encoder_layers + self.decoder_layers)
+
+    def resident_bytes(self):
+        """
+        Memory held by the weights: the stored ones plus the float32 kernels
+        evaluated, which a float32 model shares with the stored ones.
+        """
+        runtime = sum(kernel.nbytes for (kernel, _, _), (values, _, _, _)
+                      in zip(self._encoder + self._decoder, self.encoder_layers + self.decoder_layers)
+                      if not np.shares_memory(kernel, values))
+        return self.nbytes() + runtime
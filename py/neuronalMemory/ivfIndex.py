@@ -0,0 +1,174 @@
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Approximate nearest-neighbour index over the slots of a RingBuffer.
+    A k-means coarse quantizer splits the rows into n_lists inverted lists,
+    a query only scans the rows of its n_probe closest lists. Row vectors are
+    read from the ring itself, the index only keeps slot ids.
+    """
+
+    def __init__(self, ring, n_lists=64, n_probe=8, train_size=None, retrain_every=None,
+                 kmeans_iters=10, seed=0):
+        self.ring = ring
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        # rows needed before the quantizer is trained, and rows sampled to train it
+        self.train_size = min(train_size or 32 * n_lists, ring.capacity)
+        # the encoder keeps changing after the centroids are fitted, so they are
+        # refitted after this many updates (default: once per ring capacity)
+        self.retrain_every = retrain_every or ring.capacity
+        self.kmeans_iters = kmeans_iters
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+        self.list_slots = []
+        self.list_sizes = np.zeros(n_lists, dtype=np.int64)
+        self.slot_list = np.full(ring.capacity, -1, dtype=np.int64)
+        self.slot_pos = np.full(ring.capacity, -1, dtype=np.int64)
+        self.updates = 0
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def update(self, slot):
+        """
+        Re-indexes slot after the ring wrote it, either a new key, an
+        overwritten key or the eviction of the previous occupant.
+        """
+        if not self.trained:
+            if self.ring.count >= self.train_size:
+                self.train()
+            return
+        self.updates += 1
+        if self.updates >= self.retrain_every:
+            self.train()
+            return
+        self._remove(slot)
+        self._add(np.array([slot]), self._assign(self.ring.vectors(slot, slot + 1)))
+
+    def train(self):
+        """
+        Fits the coarse quantizer on a sample of the stored rows and rebuilds
+        every inverted list.
+        """
+        count = self.ring.count
+        n_lists = min(self.n_lists, count)
+        sample = np.sort(self.rng.choice(count, size=min(self.train_size, count), replace=False))
+        self.centroids = self._kmeans(self.ring.gather(sample), n_lists)
+        lists = np.concatenate([self._assign(self.ring.vectors(start, min(start + 65536, count)))
+                                for start in range(0, count, 65536)])
+
+        # bulk build: group slots by list, each list keeps 2x headroom for updates
+        order = np.argsort(lists, kind='stable')
+        self.list_sizes = np.bincount(lists, minlength=n_lists).astype(np.int64)
+        starts = np.concatenate([[0], np.cumsum(self.list_sizes)[:-1]])
+        self.list_slots = []
+        for list_id in range(n_lists):
+            slots = np.empty(max(16, 2 * self.list_sizes[list_id]), dtype=np.int64)
+            slots[:self.list_sizes[list_id]] = order[starts[list_id]:starts[list_id] + self.list_sizes[list_id]]
+            self.list_slots.append(slots)
+        self.slot_list.fill(-1)
+        self.slot_pos.fill(-1)
+        self.slot_list[order] = lists[order]
+        self.slot_pos[order] = np.arange(count) - starts[lists[order]]
+        self.updates = 0
+
+    def _kmeans(self, vectors, n_lists):
+        centroids = vectors[self.rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assign = self._nearest_centroids(vectors, centroids, 1)[:, 0]
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            counts = np.bincount(assign, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids
+
+    @staticmethod
+    def _nearest_centroids(vectors, centroids, n):
+        dists = np.einsum('ij,ij->i', centroids, centroids)[None, :] - 2 * vectors @ centroids.T
+        if n >= centroids.shape[0]:
+            return np.argsort(dists, axis=1)
+        nearest = np.argpartition(dists, n - 1, axis=1)[:, :n]
+        order = np.argsort(np.take_along_axis(dists, nearest, axis=1), axis=1)
+        return np.take_along_axis(nearest, order, axis=1)
+
+    def _assign(self, vectors):
+        return self._nearest_centroids(vectors, self.centroids, 1)[:, 0]
+
+    def _add(self, slots, lists):
+        for slot, list_id in zip(slots, lists):
+            size = self.list_sizes[list_id]
+            if size == len(self.list_slots[list_id]):
+                grown = np.empty(2 * size, dtype=np.int64)
+                grown[:size] = self.list_slots[list_id]
+                self.list_slots[list_id] = grown
+            self.list_slots[list_id][size] = slot
+            self.slot_list[slot] = list_id
+            self.slot_pos[slot] = size
+            self.list_sizes[list_id] = size + 1
+
+    def _remove(self, slot):
+        list_id = self.slot_list[slot]
+        if list_id < 0:
+            return
+        # swap the last slot of the list into the freed position
+        pos = self.slot_pos[slot]
+        last = self.list_sizes[list_id] - 1
+        moved = self.list_slots[list_id][last]
+        self.list_slots[list_id][pos] = moved
+        self.slot_pos[moved] = pos
+        self.list_sizes[list_id] = last
+        self.slot_list[slot] = -1
+        self.slot_pos[slot] = -1
+
+    def search(self, queries, k, metric='mse', exclude=None, n_probe=None):
+        """
+        Same contract as RingBuffer.search, scanning only the n_probe closest
+        lists of each query. Queries probing the same list share one matrix
+        product over its rows. Falls back to the exact scan until trained.
+        """
+        if not self.trained:
+            return self.ring.search(queries, k, metric, exclude)
+        if metric not in ('mse', 'cosine'):
+            raise ValueError(f"Unsupported metric: {metric}")
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probes = self._nearest_centroids(queries, self.centroids, n_probe)
+        q_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        k = min(k, self.ring.count)
+
+        cand_slots = [[] for _ in queries]
+        cand_dists = [[] for _ in queries]
+        for list_id in np.unique(probes):
+            slots = self.list_slots[list_id][:self.list_sizes[list_id]]
+            if len(slots) == 0:
+                continue
+            probing = np.nonzero((probes == list_id).any(axis=1))[0]
+            dots = self.ring.gather(slots) @ queries[probing].T
+            if metric == 'mse':
+                dists = np.maximum(self.ring.sq_norms[slots, None] + q_sq_norms[None, probing] - 2 * dots, 0) / self.ring.width
+            else:
+                norms = np.sqrt(self.ring.sq_norms[slots, None]) * np.sqrt(q_sq_norms[None, probing])
+                dists = -dots / np.maximum(norms, 1e-12)
+            for column, query_idx in enumerate(probing):
+                cand_slots[query_idx].append(slots)
+                cand_dists[query_idx].append(dists[:, column])
+
+        all_slots = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i in range(len(queries)):
+            if not cand_slots[i]:
+                continue
+            slots = np.concatenate(cand_slots[i])
+            dists = np.concatenate(cand_dists[i])
+            if exclude is not None and exclude[i] >= 0:
+                dists[slots == exclude[i]] = np.inf
+            n = min(k, len(slots))
+            top = np.argpartition(dists, n - 1)[:n] if len(slots) > n else np.arange(n)
+            top = top[np.argsort(dists[top])]
+            all_slots[i, :n] = slots[top]
+            all_scores[i, :n] = dists[top]
+        return all_slots, all_scores if metric == 'mse' else -all_scores
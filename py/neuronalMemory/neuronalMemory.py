@@ -1,9 +1,32 @@
+import logging
+import os
 import threading
+import time
 import tensorflow as tf
 import keras
 import numpy as np
 import uuid
-from collections import OrderedDict
+from neuronalMemory.ringBuffer import RingBuffer
+from neuronalMemory.chunks import chunk_keys, load_manifests, save_manifests
+from neuronalMemory.ivfIndex import IVFIndex
+from neuronalMemory.decodedCache import DecodedCache
+from neuronalMemory.inference import PRECISIONS, InferenceModel
+from util.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_train_steps = registry.counter("neuralstorage_train_steps_total", "Optimizer steps applied")
+_train_seconds = registry.histogram("neuralstorage_train_seconds", "Duration of a train call")
+_train_loss = registry.gauge("neuralstorage_train_loss", "Loss at the end of the last train call")
+_train_rate = registry.gauge("neuralstorage_train_steps_per_second", "Step rate of the last train call")
+_retrieve_seconds = registry.histogram("neuralstorage_retrieve_seconds", "Duration of a retrieve call")
+_stored_keys = registry.gauge("neuralstorage_memory_keys", "Keys held in memory")
+
+# dtype used to keep encoder outputs in latent storage mode
+LATENT_DTYPES = {'float32': np.float32, 'float16': np.float16, 'int8': np.int8}
+
+# uint8 value -> normalized float32, indexed instead of converting and dividing
+_BYTE_SCALE = np.arange(256, dtype=np.float32) / 255.0
 
 
 class NeuralStorage(keras.Model):
@@ -17,15 +40,131 @@ class NeuralStorage(keras.Model):
                     cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, input_size=1024, encoding_size=512, memory_capacity=12000):
+    @classmethod
+    def detached(cls, **kwargs):
+        """
+        Builds an independent NeuralStorage with its own model and memory,
+        outside the process singleton, see StorageRegistry.
+        """
+        instance = super().__new__(cls)
+        instance.__init__(**kwargs)
+        return instance
+
+    def __init__(self, input_size=1024, encoding_size=512, memory_capacity=12000,
+                 batch_size=32, flush_interval=0.5, batch_epochs=200,
+                 graph_mode=False, jit_compile=False, storage_mode='input', latent_dtype='float32',
+                 ann_lists=0, ann_probe=8, persist_dir=None, checkpoint_every=1000,
+                 train_mode='full', continual_steps=5, replay_size=32, loss_threshold=None,
+                 train_epochs=200, target_loss=None, patience=None, max_train_seconds=None,
+                 cache_bytes=32 * 1024 * 1024, chunking=False, chunk_capacity=None,
+                 inference_precision=None):
+        if getattr(self, '_initialized', False):
+            # every NeuralStorage() call returns the singleton, only the first one builds it
+            return
         self.hz = 20
         # 20Hz * 600s
         super(NeuralStorage, self).__init__()
         self.optimizer = keras.optimizers.AdamW(learning_rate=0.0005)
+        self.loss_fn = keras.losses.MeanSquaredError()
         self.input_size = input_size
         self.encoding_size = encoding_size
         self.memory_capacity = memory_capacity
-        self.memory = OrderedDict()
+        # _memory_lock guards the ring, its index and the ANN lists: stores
+        # change them under it and readers copy rows out under it, decoding
+        # outside; _write_lock keeps stores (ingest worker, flush timer) apart
+        self._memory_lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._memory_epoch = 0
+        # 'input' keeps the preprocessed input per key, 'latent' keeps only the
+        # encoder output and decodes it on retrieve; both live in a ring buffer
+        # that evicts the oldest key once memory_capacity is reached
+        if storage_mode not in ('input', 'latent'):
+            raise ValueError(f"Unsupported storage mode: {storage_mode}")
+        if latent_dtype not in LATENT_DTYPES:
+            raise ValueError(f"Unsupported latent dtype: {latent_dtype}")
+        self.storage_mode = storage_mode
+        self.latent_dtype = latent_dtype
+        # with persist_dir the memory is memory-mapped from persist_dir/memory and
+        # the weights are checkpointed every checkpoint_every stored keys, a new
+        # instance on the same directory serves the previous memories right away
+        self.persist_dir = persist_dir
+        self.checkpoint_every = checkpoint_every
+        self._stores_since_checkpoint = 0
+        memory_path = os.path.join(persist_dir, 'memory') if persist_dir else None
+        if storage_mode == 'latent':
+            # tanh output is in [-1, 1], int8 codes keep it scaled by 127
+            scale = 1.0 / 127.0 if latent_dtype == 'int8' else 1.0
+            row_format = (encoding_size, LATENT_DTYPES[latent_dtype], scale)
+        else:
+            row_format = (input_size, np.float32, 1.0)
+        self.memory = RingBuffer(memory_capacity, *row_format, memory_path)
+        # optional inverted-file index answering query_similar approximately,
+        # ann_probe of the ann_lists lists are scanned per query
+        self.ann_index = IVFIndex(self.memory, ann_lists, ann_probe) if ann_lists else None
+        if self.ann_index is not None and len(self.memory) >= self.ann_index.train_size:
+            self.ann_index.train()
+
+        # 'full' trains every new batch for the whole epoch budget, 'continual'
+        # runs at most continual_steps steps on the new batch mixed with
+        # replay_size rows sampled from memory, stopping early at loss_threshold
+        if train_mode not in ('full', 'continual'):
+            raise ValueError(f"Unsupported train mode: {train_mode}")
+        self.train_mode = train_mode
+        self.continual_steps = continual_steps
+        self.replay_size = replay_size
+        self.loss_threshold = loss_threshold
+        self._rng = np.random.default_rng()
+        # defaults of train(): epoch cap, loss to stop at, epochs without
+        # improvement to tolerate and wall-clock budget per call
+        self.train_epochs = train_epochs
+        self.target_loss = target_loss
+        self.patience = patience
+        self.max_train_seconds = max_train_seconds
+        self.last_train_metrics = None
+        # reconstruction MSE per slot, measured when the key was last trained on
+        self.recon_errors = np.full(memory_capacity, np.nan, dtype=np.float32)
+
+        if self is NeuralStorage._instance:
+            _stored_keys.set_function(lambda: len(self.memory))
+
+        # retrieve results keyed by (key, weights_version); weights_version is
+        # bumped by every optimizer step, cache_bytes=0 disables the cache
+        self.weights_version = 0
+        self.decoded_cache = DecodedCache(cache_bytes) if cache_bytes else None
+
+        # with chunking, a payload longer than input_size is split into
+        # input_size chunks trained as one batch: the first chunk is stored
+        # under the key, the others in chunk_memory (chunk_capacity rows, by
+        # default memory_capacity) under UUIDs derived from it (see
+        # chunks.chunk_key), so range, nearby and similarity lookups only see
+        # the keys. manifests keeps the payload length per chunked key.
+        self.chunking = chunking
+        self.chunk_memory = None
+        if chunking:
+            chunk_path = os.path.join(persist_dir, 'chunks') if persist_dir else None
+            self.chunk_memory = RingBuffer(chunk_capacity or memory_capacity, *row_format, chunk_path)
+        self.manifests = load_manifests(self._manifests_path()) if persist_dir else {}
+
+        # with inference_precision, retrieval decodes through a NumPy export of
+        # the weights in that precision, re-exported when the weights change
+        if inference_precision is not None and inference_precision not in PRECISIONS:
+            raise ValueError(f"Unsupported inference precision: {inference_precision}")
+        self.inference_precision = inference_precision
+        self._inference = None
+        self._inference_version = None
+
+        # micro-batching ingest: items wait in pending until batch_size is reached
+        # or the oldest one has waited flush_interval seconds, a timer flushes
+        # them when no further submit arrives; flushes run one at a time
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch_epochs = batch_epochs
+        self._pending_keys = []
+        self._pending_data = []
+        self._pending_since = None
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_timer = None
 
         self.encoder = keras.Sequential([
             keras.layers.Dense(256, activation='relu'),
@@ -44,76 +183,636 @@ class NeuralStorage(keras.Model):
             keras.layers.Dense(input_size, activation='sigmoid')
         ])
 
+        if persist_dir and os.path.exists(self._weights_path()):
+            with np.load(self._weights_path()) as weights:
+                # a checkpoint taken before the first training step holds no weights
+                saved = [weights[f'arr_{i}'] for i in range(len(weights.files))]
+            if saved:
+                self(tf.zeros((1, input_size), dtype=tf.float32))
+                self.set_weights(saved)
+
+        # graph mode traces train/inference once for a (None, input_size) signature,
+        # optionally compiled by XLA, instead of dispatching every op eagerly
+        self.graph_mode = graph_mode
+        self.use_xla = jit_compile
+        if graph_mode:
+            self._build_graph_functions()
+        self._initialized = True
+
+    def _weights_path(self):
+        return os.path.join(self.persist_dir, 'weights.npz')
+
+    def _manifests_path(self):
+        return os.path.join(self.persist_dir, 'manifests.npz')
+
+    def checkpoint(self):
+        """
+        Flushes the memory-mapped memory and saves the encoder/decoder weights
+        to persist_dir, replacing the previous checkpoint atomically. The
+        weights are also exported to inference.npz for a ReadReplica. Before
+        the model is built there are no weights to save.
+        """
+        if not self.persist_dir:
+            raise ValueError("checkpoint needs a persist_dir")
+        with self._memory_lock:
+            self.memory.flush()
+            if self.chunk_memory is not None:
+                self.chunk_memory.flush()
+            manifests = dict(self.manifests)
+            metadata = self._replica_metadata()
+        if manifests or os.path.exists(self._manifests_path()):
+            save_manifests(self._manifests_path(), manifests)
+        if self.encoder.built and self.decoder.built:
+            tmp_path = os.path.join(self.persist_dir, 'weights.tmp.npz')
+            np.savez(tmp_path, *self.get_weights())
+            os.replace(tmp_path, self._weights_path())
+            self.export_inference(metadata=metadata).save(
+                os.path.join(self.persist_dir, 'inference.npz'))
+        self._stores_since_checkpoint = 0
+
+    def _build_graph_functions(self):
+        signature = [tf.TensorSpec(shape=(None, self.input_size), dtype=tf.float32)]
+        latent_signature = [tf.TensorSpec(shape=(None, self.encoding_size), dtype=tf.float32)]
+        self._train_fn = tf.function(self._train_step, input_signature=signature, jit_compile=self.use_xla)
+        self._infer_fn = tf.function(self.call, input_signature=signature, jit_compile=self.use_xla)
+        self._encode_fn = tf.function(self.encoder, input_signature=signature, jit_compile=self.use_xla)
+        self._decode_fn = tf.function(self.decoder, input_signature=latent_signature, jit_compile=self.use_xla)
+        # variables (model and optimizer slots) must exist before tracing
+        self(tf.zeros((1, self.input_size), dtype=tf.float32))
+        self.optimizer.build(self.trainable_variables)
+        for fn in (self._train_fn, self._infer_fn, self._encode_fn, self._decode_fn):
+            fn.get_concrete_function()
+
     def call(self, x):
         encoded = self.encoder(x)
         decoded = self.decoder(encoded)
         return decoded
 
     def train_step(self, data):
+        if self.graph_mode:
+            loss = self._train_fn(data)
+        else:
+            loss = self._train_step(data)
+        self.weights_version += 1
+        return {"loss": loss}
+
+    def _train_step(self, data):
         with tf.GradientTape() as tape:
             decoded = self(data)
-            loss = keras.losses.MeanSquaredError()(data, decoded)
+            loss = self.loss_fn(data, decoded)
         gradients = tape.gradient(loss, self.trainable_variables)
         self.optimizer.apply_gradients(zip(gradients, self.trainable_variables))
-        return {"loss": loss}
+        return loss
+
+    def infer(self, x):
+        """
+        Runs the encoder and decoder, through the traced function in graph mode.
+        """
+        if self.graph_mode:
+            return self._infer_fn(x)
+        return self(x)
+
+    def encode(self, x):
+        if self.graph_mode:
+            return self._encode_fn(x)
+        return self.encoder(x)
+
+    def decode(self, z):
+        if self.graph_mode:
+            return self._decode_fn(z)
+        return self.decoder(z)
+
+    def export_inference(self, precision='float32', metadata=None):
+        """
+        Snapshots the current weights as an InferenceModel in precision.
+        """
+        return InferenceModel.from_storage(self, precision, metadata)
+
+    def _replica_metadata(self):
+        # what a ReadReplica needs to map the memory without this constructor,
+        # and the write stamps from which rows are newer than the checkpoint
+        return {'storage_mode': self.storage_mode, 'input_size': self.input_size,
+                'memory_capacity': self.memory_capacity, 'memory_width': self.memory.width,
+                'memory_dtype': self.memory.rows.dtype.name, 'memory_scale': float(self.memory.scale),
+                'memory_next_stamp': self.memory.next_stamp,
+                'chunk_capacity': self.chunk_memory.capacity if self.chunk_memory is not None else 0,
+                'chunk_next_stamp': self.chunk_memory.next_stamp if self.chunk_memory is not None else 0}
+
+    def _inference_model(self):
+        if self._inference is None or self._inference_version != self.weights_version:
+            self._inference = self.export_inference(self.inference_precision)
+            self._inference_version = self.weights_version
+        return self._inference
+
+    def _to_memory(self, batch):
+        """
+        Converts a preprocessed (N, input_size) batch into what memory keeps per row.
+        """
+        if self.storage_mode == 'input':
+            return np.asarray(batch)
+        latent = self.encode(batch).numpy()
+        if self.latent_dtype == 'int8':
+            return np.round(latent * 127.0).astype(np.int8)
+        return latent.astype(LATENT_DTYPES[self.latent_dtype])
+
+    def _reconstruct(self, stored):
+        """
+        Decodes rows taken from memory back to (N, input_size) outputs.
+        """
+        if self.inference_precision is not None:
+            model = self._inference_model()
+            if self.storage_mode == 'input':
+                return model(stored)
+            return model.decode(self._stored_to_float(stored))
+        if self.storage_mode == 'input':
+            return self.infer(stored)
+        return self.decode(self._stored_to_float(stored))
+
+    def _stored_to_float(self, stored):
+        stored = np.asarray(stored, dtype=np.float32)
+        return stored * np.float32(self.memory.scale) if self.memory.scale != 1.0 else stored
+
+    def _memory_vector(self, key):
+        return self._stored_to_float(self.memory[key])
+
+    def _remember(self, key, row, error=np.nan):
+        with self._memory_lock:
+            self._memory_epoch += 1
+            evicted = self.memory.put(key, row)
+            if evicted is not None:
+                self._set_manifest(evicted, None)
+            if self.decoded_cache is not None:
+                self.decoded_cache.invalidate(key)
+                if evicted is not None:
+                    self.decoded_cache.invalidate(evicted)
+            self.recon_errors[self.memory.index[key]] = error
+            if self.ann_index is not None:
+                self.ann_index.update(self.memory.index[key])
+            if self.persist_dir:
+                self._stores_since_checkpoint += 1
+                if self._stores_since_checkpoint >= self.checkpoint_every:
+                    self.checkpoint()
+
+    def _remember_rows(self, row_keys, stored, errors, owners):
+        """
+        Writes the rows of a trained batch, owners being per row the
+        (key, payload length, last row) _split gives: the first row of a key
+        goes to memory, its other chunks to chunk_memory, and the manifest of
+        the key is updated along with its last row.
+        """
+        with self._memory_lock:
+            for idx, (row_key, (key, length, last)) in enumerate(zip(row_keys, owners)):
+                if row_key == key:
+                    self._remember(row_key, stored[idx:idx + 1], errors[idx])
+                else:
+                    self._memory_epoch += 1
+                    self.chunk_memory.put(row_key, stored[idx:idx + 1])
+                if last:
+                    self._set_manifest(key, length)
+
+    def _set_manifest(self, key, length):
+        """
+        Records the payload length of key, None when it is not chunked, and
+        discards the chunks of its previous payload the new one does not
+        overwrite. Called with _memory_lock held.
+        """
+        old_length = self.manifests.pop(key, None)
+        if length is not None:
+            self.manifests[key] = length
+        if old_length is not None and self.chunk_memory is not None:
+            kept = len(chunk_keys(key, length, self.input_size)) if length is not None else 1
+            for stale_key in chunk_keys(key, old_length, self.input_size)[kept:]:
+                self.chunk_memory.discard(stale_key)
+        self._memory_epoch += 1
+        if self.decoded_cache is not None:
+            self.decoded_cache.invalidate(key)
+
+    def _learn(self, batch, epochs=None):
+        """
+        Trains on a new (N, input_size) batch according to train_mode and
+        returns the reconstruction MSE of each of its rows afterwards.
+        """
+        if self.train_mode == 'full':
+            self.train(batch, epochs=epochs)
+            return self._row_errors(batch)
+
+        replay_slots = np.sort(self._rng.choice(len(self.memory), size=min(self.replay_size, len(self.memory)),
+                                                replace=False))
+        mixed = np.concatenate([np.asarray(batch), self._replay_inputs(replay_slots)])
+        self.train(mixed, epochs=self.continual_steps, target_loss=self.loss_threshold)
+        errors = self._row_errors(mixed)
+        with self._memory_lock:
+            self.recon_errors[replay_slots] = errors[len(batch):]
+        return errors[:len(batch)]
+
+    def _replay_inputs(self, slots):
+        """
+        Training rows for replayed slots: the stored inputs, or in latent mode
+        the current decoding of the stored codes (pseudo-rehearsal), since the
+        inputs themselves are not kept.
+        """
+        with self._memory_lock:
+            rows = self.memory.rows[slots]
+        if self.storage_mode == 'input':
+            return rows
+        return np.asarray(self.decode(self._stored_to_float(rows)))
+
+    def _row_errors(self, batch):
+        batch = np.asarray(batch)
+        return np.mean((np.asarray(self.infer(batch)) - batch) ** 2, axis=1)
+
+    def reconstruction_error(self, key):
+        """
+        Reconstruction MSE of key when it was last trained on, None if unknown.
+        """
+        with self._memory_lock:
+            if key not in self.memory:
+                return None
+            error = self.recon_errors[self.memory.index[key]]
+        return None if np.isnan(error) else float(error)
+
+    def _split(self, keys, datas):
+        """
+        Expands the payloads longer than input_size into their chunks. Returns
+        the keys and payloads of the rows and their owners for _remember_rows.
+        """
+        row_keys, row_datas, owners = [], [], []
+        for key, data in zip(keys, datas):
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            if isinstance(data, bytes):
+                data = np.frombuffer(data, dtype=np.uint8)
+            values = data.reshape(-1) if isinstance(data, np.ndarray) else data
+            if not isinstance(values, np.ndarray) or values.size <= self.input_size:
+                row_keys.append(key)
+                row_datas.append(data)
+                owners.append((key, None, True))
+                continue
+            keys_of_chunks = chunk_keys(key, values.size, self.input_size)
+            row_keys.extend(keys_of_chunks)
+            row_datas.extend(values[start:start + self.input_size]
+                             for start in range(0, values.size, self.input_size))
+            owners.extend((key, values.size, idx == len(keys_of_chunks) - 1) for idx in range(len(keys_of_chunks)))
+        return row_keys, row_datas, owners
 
     def store(self, key, data):
+        with self._write_lock:
+            return self._store(key, data)
+
+    def _store(self, key, data):
+        # reject a key the memory cannot hold before training on its data
+        self.memory.validate_key(key)
+        owners = [(key, None, True)]
+        if self.chunking:
+            row_keys, row_datas, owners = self._split([key], [data])
+            if len(row_keys) > 1:
+                # every chunk of the payload in one training batch
+                input_data = tf.convert_to_tensor(self.preprocess_batch(row_datas))
+                errors = self._learn(input_data)
+                self._remember_rows(row_keys, self._to_memory(input_data), errors, owners)
+                return input_data
         input_data = self.preprocess_data(data)
-        self.train(input_data)
-        self.memory[key] = input_data
-        self._enforce_memory_capacity()
+        errors = self._learn(input_data)
+        self._remember_rows([key], self._to_memory(input_data), errors, owners)
         return input_data
 
+    def store_many(self, keys, datas, epochs=None):
+        """
+        Stores several items at once. Items are stacked into (N, input_size)
+        batches of at most batch_size rows and each batch is trained together
+        for epochs (default batch_epochs, unused in continual mode), so the
+        training cost is paid per batch instead of per key.
+        """
+        with self._write_lock:
+            return self._store_many(keys, datas, epochs)
+
+    def _store_many(self, keys, datas, epochs):
+        keys = list(keys)
+        datas = list(datas)
+        if len(keys) != len(datas):
+            raise ValueError("keys and datas must have the same length")
+        # reject keys the memory cannot hold before training on their data
+        for key in keys:
+            self.memory.validate_key(key)
+        owners = [(key, None, True) for key in keys]
+        if self.chunking:
+            keys, datas, owners = self._split(keys, datas)
+        if not keys:
+            return None
+        if epochs is None:
+            epochs = self.batch_epochs
+
+        batches = []
+        for start in range(0, len(keys), self.batch_size):
+            batch_keys = keys[start:start + self.batch_size]
+            batch = tf.convert_to_tensor(self.preprocess_batch(datas[start:start + self.batch_size]))
+            errors = self._learn(batch, epochs)
+            self._remember_rows(batch_keys, self._to_memory(batch), errors,
+                                owners[start:start + self.batch_size])
+            batches.append(batch)
+        return tf.concat(batches, axis=0)
+
+    def submit(self, key, data):
+        """
+        Queues one item for micro-batched ingestion. The pending items are
+        flushed through store_many once batch_size items are waiting or the
+        oldest one has waited flush_interval seconds. Returns True if this
+        call triggered a flush.
+        """
+        with self._pending_lock:
+            if not self._pending_keys:
+                self._pending_since = time.monotonic()
+            self._pending_keys.append(key)
+            self._pending_data.append(data)
+            due = self._flush_due()
+            if not due:
+                self._arm_flush_timer()
+        if due:
+            self.flush()
+        return due
+
+    def flush(self):
+        """
+        Stores every pending item now, returns the number of items flushed.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                keys, datas = self._pending_keys, self._pending_data
+                self._pending_keys, self._pending_data = [], []
+                self._pending_since = None
+            self.store_many(keys, datas)
+        return len(keys)
+
+    def flush_if_due(self):
+        """
+        Flushes the pending items if the batch is full or the flush latency
+        has passed, polled by the flush timer when input stops arriving.
+        """
+        with self._pending_lock:
+            due = self._flush_due()
+        return self.flush() if due else 0
+
+    def _arm_flush_timer(self):
+        # called with _pending_lock held
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self._on_flush_timer)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _on_flush_timer(self):
+        with self._pending_lock:
+            self._flush_timer = None
+        try:
+            self.flush_if_due()
+        except Exception:
+            logger.exception("Timed flush failed")
+        with self._pending_lock:
+            if self._pending_keys:
+                self._arm_flush_timer()
+
+    def _flush_due(self):
+        if not self._pending_keys:
+            return False
+        return (len(self._pending_keys) >= self.batch_size
+                or time.monotonic() - self._pending_since >= self.flush_interval)
+
     def retrieve(self, key):
-        if key in self.memory:
-            output = self(self.memory[key])
-            return self.postprocess_data(output)
-        else:
+        start = time.monotonic()
+        try:
+            with self._memory_lock:
+                if key not in self.memory:
+                    return None
+                version = self.weights_version
+                if self.decoded_cache is not None:
+                    cached = self.decoded_cache.get(key, version)
+                    if cached is not None:
+                        return cached
+                length = self.manifests.get(key)
+                rows = self._key_rows(key, length)
+                epoch = self._memory_epoch
+            if rows is None:
+                return None
+            output = self.postprocess_data(self._reconstruct(rows))
+            if length is not None:
+                output = output[:length]
+            if self.decoded_cache is not None:
+                with self._memory_lock:
+                    # unless a store since the copy may already have invalidated key
+                    if self._memory_epoch == epoch:
+                        self.decoded_cache.put(key, version, output)
+            return output
+        finally:
+            _retrieve_seconds.observe(time.monotonic() - start)
+
+    def _key_rows(self, key, length):
+        """
+        Copy of the memory rows of key, every chunk of it when length is set,
+        None if a chunk has been evicted. Called with _memory_lock held.
+        """
+        if length is None:
+            return self.memory[key].copy()
+        if self.chunk_memory is None:
+            return None
+        chunks = chunk_keys(key, length, self.input_size)[1:]
+        if any(chunk not in self.chunk_memory for chunk in chunks):
             return None
+        slots = np.array([self.chunk_memory.index[chunk] for chunk in chunks])
+        return np.concatenate([self.memory[key], self.chunk_memory.rows[slots]])
+
+    def retrieve_many(self, keys):
+        """
+        Decodes the stored keys among keys with one batched forward pass.
+        Returns (found_keys, outputs), outputs being a (N, input_size) uint8
+        array in the postprocess_data encoding. With chunking, outputs is a
+        list with the whole payload of each key as a 1-D uint8 array, and a
+        key one of whose chunks has been evicted is not found.
+        """
+        with self._memory_lock:
+            found = [key for key in keys if key in self.memory]
+            if self.chunking:
+                found, key_rows, lengths = self._chunked_rows(found)
+            elif found:
+                rows = self.memory.rows[np.array([self.memory.index[key] for key in found])]
+        if not found:
+            return [], self._no_outputs()
+        if self.chunking:
+            return found, self._payloads(key_rows, lengths)
+        outputs = np.asarray(self._reconstruct(rows))
+        return found, (outputs * 255).astype(np.uint8)
+
+    def _no_outputs(self):
+        return [] if self.chunking else np.empty((0, self.input_size), dtype=np.uint8)
+
+    def _chunked_rows(self, keys):
+        """
+        Copies the rows of every chunk of the stored keys, skipping keys with
+        an evicted chunk. Returns (keys, rows per key, payload lengths), the
+        length being None for an unchunked key. Called with _memory_lock held.
+        """
+        found, key_rows, lengths = [], [], []
+        for key in keys:
+            length = self.manifests.get(key)
+            rows = self._key_rows(key, length)
+            if rows is not None:
+                found.append(key)
+                key_rows.append(rows)
+                lengths.append(length)
+        return found, key_rows, lengths
+
+    def _payloads(self, key_rows, lengths):
+        """
+        Decodes the rows of _chunked_rows in one forward pass, returning the
+        payload of each key as a 1-D uint8 array cut to its length.
+        """
+        outputs = (np.asarray(self._reconstruct(np.concatenate(key_rows))) * 255).astype(np.uint8)
+        bounds = np.cumsum([len(rows) for rows in key_rows])[:-1]
+        return [output.reshape(-1)[:length] for output, length in zip(np.split(outputs, bounds), lengths)]
+
+    def input_vectors(self, keys):
+        """
+        The stored keys among keys as (found_keys, vectors), vectors being
+        (N, input_size) float32 rows in input space: the stored inputs, or in
+        latent mode the decoding of the stored codes. For a chunked key this
+        is the row of its first chunk only, the row similarity ranks it by,
+        not its payload.
+        """
+        with self._memory_lock:
+            found = [key for key in keys if key in self.memory]
+            rows = self.memory.rows[np.array([self.memory.index[key] for key in found], dtype=np.int64)]
+        if self.storage_mode == 'input':
+            return found, np.asarray(rows, dtype=np.float32)
+        return found, np.asarray(self._reconstruct(rows), dtype=np.float32).reshape(len(found), self.input_size)
+
+    def retrieve_range(self, key_from, key_to_exclude=None, limit=None):
+        """
+        Decodes the stored keys in [key_from, key_to_exclude), up to the newest
+        key when key_to_exclude is None, with one batched decoder call for at
+        most limit keys. The bounds need not be stored keys: keys are assumed
+        to be stored in increasing order and are found by binary search.
+        Returns (keys, outputs, next_key): outputs is as in retrieve_many and
+        next_key the key to continue from, None when the range is exhausted.
+        """
+        with self._memory_lock:
+            start = self.memory.bisect(key_from)
+            stop = len(self.memory) if key_to_exclude is None else self.memory.bisect(key_to_exclude)
+            stop = max(stop, start)
+            end = stop if limit is None else min(stop, start + limit)
+            if end == start:
+                return [], self._no_outputs(), None
+            slots = self.memory.positions_to_slots(start, end)
+            keys = list(self.memory.slot_keys[slots])
+            next_key = self.memory.key_at(end) if end < stop else None
+            if self.chunking:
+                keys, key_rows, lengths = self._chunked_rows(keys)
+            else:
+                rows = self.memory.rows[slots]
+        if self.chunking:
+            return keys, self._payloads(key_rows, lengths) if keys else [], next_key
+        outputs = np.asarray(self._reconstruct(rows))
+        return keys, (outputs * 255).astype(np.uint8), next_key
 
     def store_and_retrieve(self, key, data):
         self.store(key, data)
         return self.retrieve(key)
 
     def preprocess_data(self, data):
-        if isinstance(data, str):
-            data = np.frombuffer(data.encode('utf-8'), dtype=np.uint8)
-        elif isinstance(data, bytes):
-            data = np.frombuffer(data, dtype=np.uint8)
-        elif isinstance(data, np.ndarray):
-            pass  # If it's already a NumPy array, do nothing
-        else:
-            raise ValueError("Unsupported data type")
-
-        # Normalize data to [0, 1] range
-        data = data.astype(np.float32) / 255.0
+        return tf.convert_to_tensor(self.preprocess_batch([data]))
 
-        # Pad or truncate to match input size
-        if data.size < self.input_size:
-            padded_data = np.pad(data, (0, self.input_size - data.size), 'constant')
-        elif data.size > self.input_size:
-            padded_data = data[:self.input_size]
-        else:
-            padded_data = data
-
-        return tf.convert_to_tensor(padded_data.reshape(1, -1), dtype=tf.float32)
+    def preprocess_batch(self, datas, out=None):
+        """
+        Writes the payloads of datas (bytes, str or arrays, any length) as
+        rows of out, a (N, input_size) float32 buffer allocated if not given,
+        truncating or zero-padding each to input_size. Bytes, str and integer
+        arrays are byte values scaled to [0, 1], uint8 through a lookup table;
+        float arrays are taken as already normalized and copied unchanged.
+        """
+        if out is None:
+            out = np.empty((len(datas), self.input_size), dtype=np.float32)
+        elif out.shape != (len(datas), self.input_size) or out.dtype != np.float32:
+            raise ValueError(f"out must be a float32 array of shape {(len(datas), self.input_size)}")
+        for row, data in zip(out, datas):
+            if isinstance(data, str):
+                data = np.frombuffer(data.encode('utf-8'), dtype=np.uint8)
+            elif isinstance(data, bytes):
+                data = np.frombuffer(data, dtype=np.uint8)
+            elif not isinstance(data, np.ndarray):
+                raise ValueError("Unsupported data type")
+            values = data.reshape(-1)[:self.input_size]
+            size = values.size
+            if values.dtype == np.uint8:
+                np.take(_BYTE_SCALE, values, out=row[:size])
+            elif values.dtype.kind in 'iu':
+                np.multiply(values, np.float32(1.0 / 255.0), out=row[:size], casting='unsafe')
+            elif values.dtype.kind == 'f':
+                row[:size] = values
+            else:
+                raise ValueError(f"Unsupported array dtype: {values.dtype}")
+            row[size:] = 0.0
+        return out
 
     @staticmethod
     def postprocess_data(output):
-        output_data = output.numpy().flatten()
+        output_data = np.asarray(output).flatten()
         output_data = (output_data * 255).astype(np.uint8)
         return output_data.tobytes()
 
-    def train(self, data, epochs=200):
+    def train(self, data, epochs=None, target_loss=None, patience=None, max_seconds=None, min_delta=0.0):
+        """
+        Trains on data for at most epochs steps, stopping early once the loss
+        reaches target_loss, after patience steps without improving the best
+        loss by more than min_delta, or after max_seconds. Arguments left None
+        take the instance defaults. Returns the metrics of the call, also kept
+        in last_train_metrics: epochs used, final loss, seconds and stop reason.
+        """
+        epochs = self.train_epochs if epochs is None else epochs
+        target_loss = self.target_loss if target_loss is None else target_loss
+        patience = self.patience if patience is None else patience
+        max_seconds = self.max_train_seconds if max_seconds is None else max_seconds
+        # reading the loss back every step is only needed to stop early
+        watch_loss = target_loss is not None or patience is not None
+
+        start = time.monotonic()
+        best = np.inf
+        stale = 0
+        used = 0
+        stopped = 'epochs'
+        loss = None
         for epoch in range(epochs):
-            metrics = self.train_step(data)
-            if epoch % 20 == 0:
-                print(f"Epoch: {epoch}, Loss: {metrics['loss']}")
-
-    def _enforce_memory_capacity(self):
-        while len(self.memory) > self.memory_capacity:
-            oldest_key = next(iter(self.memory))
-            del self.memory[oldest_key]
+            loss = self.train_step(data)["loss"]
+            used = epoch + 1
+            if watch_loss:
+                loss = float(loss)
+                if target_loss is not None and loss <= target_loss:
+                    stopped = 'target_loss'
+                    break
+                if patience is not None:
+                    if loss < best - min_delta:
+                        best = loss
+                        stale = 0
+                    else:
+                        stale += 1
+                        if stale >= patience:
+                            stopped = 'patience'
+                            break
+            if max_seconds is not None and time.monotonic() - start >= max_seconds:
+                stopped = 'time'
+                break
+
+        metrics = {
+            "epochs": used,
+            "loss": float(loss) if loss is not None else None,
+            "seconds": time.monotonic() - start,
+            "stopped": stopped,
+        }
+        self.last_train_metrics = metrics
+        _train_steps.inc(used)
+        _train_seconds.observe(metrics["seconds"])
+        if metrics["loss"] is not None:
+            _train_loss.set(metrics["loss"])
+        if metrics["seconds"] > 0:
+            _train_rate.set(used / metrics["seconds"])
+        logger.debug("train: %s", metrics)
+        return metrics
 
     def get_nearby(self, center_key):
         """
@@ -121,36 +820,32 @@ class NeuralStorage(keras.Model):
         their encoded data representations. Only looks at adjacent keys
         (within 1 position before and after).
         """
-        if center_key not in self.memory:
-            return None
-
-        keys = list(self.memory.keys())
-        center_idx = keys.index(center_key)
+        with self._memory_lock:
+            if center_key not in self.memory:
+                return None
 
-        # Check previous and next items, if possible
-        prev_key = keys[center_idx - 1] if center_idx > 0 else None
-        next_key = keys[center_idx + 1] if center_idx < len(keys) - 1 else None
+            prev_key, next_key = self.memory.neighbours(center_key)
 
-        # Retrieve the closest key based on data similarity (mean squared error)
-        center_data = self.memory[center_key]
+            # Retrieve the closest key based on data similarity (mean squared error)
+            center_data = self._memory_vector(center_key)
 
-        # Calculate similarities (MSE) for the previous and next keys
-        similarities = []
-        if prev_key:
-            prev_data = self.memory[prev_key]
-            mse = np.mean((center_data - prev_data) ** 2)
-            similarities.append((prev_key, mse))
+            # Calculate similarities (MSE) for the previous and next keys
+            similarities = []
+            if prev_key is not None:
+                prev_data = self._memory_vector(prev_key)
+                mse = np.mean((center_data - prev_data) ** 2)
+                similarities.append((prev_key, mse))
 
-        if next_key:
-            next_data = self.memory[next_key]
-            mse = np.mean((center_data - next_data) ** 2)
-            similarities.append((next_key, mse))
+            if next_key is not None:
+                next_data = self._memory_vector(next_key)
+                mse = np.mean((center_data - next_data) ** 2)
+                similarities.append((next_key, mse))
 
-        # Find the key with the minimum MSE (i.e., most similar)
-        if similarities:
-            return min(similarities, key=lambda x: x[1])[0]
-        else:
-            return None
+            # Find the key with the minimum MSE (i.e., most similar)
+            if similarities:
+                return min(similarities, key=lambda x: x[1])[0]
+            else:
+                return None
 
     def get_nearby_from_to(self, from_key, to_key):
         """
@@ -158,21 +853,78 @@ class NeuralStorage(keras.Model):
         using the get_nearby method. Returns a list of stored data
         from the nearby keys.
         """
-        nearby_keys = []
-        keys = list(self.memory.keys())
-
-        try:
-            from_idx = keys.index(from_key)
-            to_idx = keys.index(to_key)
-        except ValueError:
+        with self._memory_lock:
+            if from_key not in self.memory or to_key not in self.memory:
+                return []
+            from_pos = self.memory.position(from_key)
+            to_pos = self.memory.position(to_key)
+            if from_pos > to_pos or self.memory.count < 2:
+                return []
+
+            # rows of the range plus one neighbour on each side, so the MSE between
+            # consecutive rows is computed once for the whole range
+            lo = max(from_pos - 1, 0)
+            hi = min(to_pos + 2, self.memory.count)
+            slots = self.memory.positions_to_slots(lo, hi)
+            stored = self.memory.rows[slots]
+        rows = self._stored_to_float(stored)
+        step_mse = np.mean((rows[1:] - rows[:-1]) ** 2, axis=1)
+
+        nearby = []
+        for pos in range(from_pos, to_pos + 1):
+            i = pos - lo
+            prev_mse = step_mse[i - 1] if i > 0 else np.inf
+            next_mse = step_mse[i] if i < len(step_mse) else np.inf
+            nearby.append(i + 1 if next_mse < prev_mse else i - 1)
+
+        outputs = np.asarray(self._reconstruct(stored[nearby]))
+        return [self.postprocess_data(output) for output in outputs]
+
+    def query_similar(self, data_or_key, k=5, metric='mse', exact=False, n_probe=None):
+        """
+        Finds the k stored keys whose memory vectors (inputs, or encodings in
+        latent mode) are closest to the query, scored against the whole memory
+        in one matrix operation. The query is a stored key, which is then left
+        out of its own result, or data accepted by preprocess_data. A list of
+        queries is answered as a batch. Returns [(key, score), ...] best first,
+        score being the MSE or the cosine similarity, or one such list per query.
+        With an ANN index the search is approximate unless exact is set,
+        n_probe overrides the number of lists scanned.
+        """
+        batched = isinstance(data_or_key, list)
+        queries = data_or_key if batched else [data_or_key]
+        if not queries:
             return []
 
-        for i in range(from_idx, to_idx + 1):
-            nearby_key = self.get_nearby(keys[i])
-            if nearby_key:
-                nearby_keys.append(self.memory[nearby_key])
+        # data queries are encoded before taking the lock, keys are read under it
+        vectors = [None if self._is_key_query(query) else
+                   self._stored_to_float(self._to_memory(self.preprocess_data(query))) for query in queries]
+        with self._memory_lock:
+            if len(self.memory) == 0:
+                return [[] for _ in queries] if batched else []
+            exclude = []
+            for i, query in enumerate(queries):
+                if vectors[i] is None and query in self.memory:
+                    vectors[i] = self._memory_vector(query)
+                    exclude.append(self.memory.index[query])
+                elif vectors[i] is None:
+                    raise ValueError(f"Key {query!r} is not stored")
+                else:
+                    exclude.append(-1)
+
+            if self.ann_index is not None and not exact:
+                slots, scores = self.ann_index.search(np.concatenate(vectors), k, metric, exclude, n_probe)
+            else:
+                slots, scores = self.memory.search(np.concatenate(vectors), k, metric, exclude)
+            results = []
+            for row_slots, row_scores in zip(slots, scores):
+                results.append([(self.memory.slot_keys[slot], float(score))
+                                for slot, score in zip(row_slots, row_scores) if np.isfinite(score)])
+        return results if batched else results[0]
 
-        return [self.postprocess_data(self(nearby_key)) for nearby_key in nearby_keys]
+    @staticmethod
+    def _is_key_query(query):
+        return not isinstance(query, (bytes, str, np.ndarray))
 
     def saveTensor(self, key, tensor):
         """
@@ -0,0 +1,165 @@
+import os
+
+import numpy as np
+
+from neuronalMemory.chunks import chunk_keys, load_manifests
+from neuronalMemory.inference import InferenceModel
+from neuronalMemory.ringBuffer import RingBuffer
+
+
+class ReadReplica:
+    """
+    Read-only view of a persist_dir written by NeuralStorage.checkpoint,
+    serving retrieve and retrieve_range with the NumPy forward pass of
+    inference.npz over the memory-mapped ring buffer. Neither TensorFlow nor
+    Keras is imported, so a replica starts in a fraction of a second.
+
+    The key index and weights are those of the last refresh, which picks up
+    a newer checkpoint. The rows are the writer's live memmap: every read
+    checks that the write stamps of its slots are still those seen at
+    refresh and older than the checkpoint, so keys written after the
+    checkpoint, or rewritten since the refresh, are not found.
+    """
+
+    def __init__(self, persist_dir):
+        self.persist_dir = persist_dir
+        self.model = None
+        self.memory = None
+        self.chunk_memory = None
+        self.manifests = {}
+        self._model_mtime = None
+        self.refresh()
+
+    def refresh(self):
+        model_path = os.path.join(self.persist_dir, 'inference.npz')
+        mtime = os.path.getmtime(model_path)
+        if mtime != self._model_mtime:
+            self.model = InferenceModel.load(model_path)
+            self._model_mtime = mtime
+        metadata = self.model.metadata
+        self.storage_mode = metadata['storage_mode']
+        self.input_size = metadata['input_size']
+        row_format = (metadata['memory_width'], np.dtype(metadata['memory_dtype']), metadata['memory_scale'])
+        if self.memory is None:
+            self.memory = RingBuffer(metadata['memory_capacity'], *row_format,
+                                     os.path.join(self.persist_dir, 'memory'), read_only=True)
+        else:
+            self.memory.reload()
+        if self.chunk_memory is not None:
+            self.chunk_memory.reload()
+        elif metadata.get('chunk_capacity'):
+            self.chunk_memory = RingBuffer(metadata['chunk_capacity'], *row_format,
+                                           os.path.join(self.persist_dir, 'chunks'), read_only=True)
+        # write stamp per slot as indexed, see _rows; rows written after the
+        # checkpoint do not match its weights and manifests and never match
+        self._stamps = self._checkpointed_stamps(self.memory, metadata['memory_next_stamp'])
+        self._chunk_stamps = None
+        if self.chunk_memory is not None:
+            self._chunk_stamps = self._checkpointed_stamps(self.chunk_memory, metadata['chunk_next_stamp'])
+        self.manifests = load_manifests(os.path.join(self.persist_dir, 'manifests.npz'))
+
+    @staticmethod
+    def _checkpointed_stamps(ring, next_stamp):
+        stamps = np.array(ring.stamps)
+        stamps[stamps >= next_stamp] = -2
+        return stamps
+
+    @staticmethod
+    def _rows(ring, stamps, slots):
+        """
+        Copies the rows of slots, returning them with a mask of those still
+        holding the row indexed at refresh. The write stamps are compared
+        after the copy, as the writer clears them before writing a row.
+        """
+        rows = np.array(ring.rows[slots])
+        return rows, ring.stamps[slots] == stamps[slots]
+
+    def _reconstruct(self, stored):
+        stored = np.asarray(stored, dtype=np.float32)
+        if self.storage_mode == 'input':
+            return self.model(stored)
+        if self.memory.scale != 1.0:
+            stored = stored * np.float32(self.memory.scale)
+        return self.model.decode(stored)
+
+    def retrieve(self, key):
+        """
+        Same bytes as NeuralStorage.retrieve as of the checkpoint loaded by the
+        last refresh, None if key was not stored in it or has been rewritten
+        or evicted since.
+        """
+        if key not in self:
+            return None
+        rows = self._key_rows(key)
+        if rows is None:
+            return None
+        output = (self._reconstruct(rows).reshape(-1) * 255).astype(np.uint8).tobytes()
+        return output[:self.manifests.get(key)]
+
+    def _key_rows(self, key):
+        """
+        Copy of the rows of an indexed key, every chunk of it when chunked,
+        None if one of them is missing or has been rewritten.
+        """
+        rows, valid = self._rows(self.memory, self._stamps, np.array([self.memory.index[key]]))
+        length = self.manifests.get(key)
+        if length is not None:
+            chunks = chunk_keys(key, length, self.input_size)[1:]
+            if self.chunk_memory is None or any(chunk not in self.chunk_memory for chunk in chunks):
+                return None
+            chunk_rows, chunks_valid = self._rows(self.chunk_memory, self._chunk_stamps,
+                                                  np.array([self.chunk_memory.index[chunk] for chunk in chunks]))
+            rows = np.concatenate([rows, chunk_rows])
+            valid = np.concatenate([valid, chunks_valid])
+        return rows if valid.all() else None
+
+    def retrieve_range(self, key_from, key_to_exclude=None, limit=None):
+        """
+        See NeuralStorage.retrieve_range, over the keys indexed at the last
+        refresh. Keys evicted since are left out of the page. When the writer
+        chunks payloads, outputs is a list of whole payloads as there.
+        """
+        chunked = self.chunk_memory is not None
+        no_outputs = [] if chunked else np.empty((0, self.input_size), dtype=np.uint8)
+        start = self.memory.bisect(key_from)
+        stop = len(self.memory) if key_to_exclude is None else self.memory.bisect(key_to_exclude)
+        stop = max(stop, start)
+        end = stop if limit is None else min(stop, start + limit)
+        if end == start:
+            return [], no_outputs, None
+        slots = self.memory.positions_to_slots(start, end)
+        next_key = self.memory.key_at(end) if end < stop else None
+        if chunked:
+            keys, outputs = self._payloads(self.memory.slot_keys[slots])
+            return keys, outputs, next_key
+        rows, valid = self._rows(self.memory, self._stamps, slots)
+        if not valid.any():
+            return [], no_outputs, next_key
+        outputs = self._reconstruct(rows[valid])
+        return list(self.memory.slot_keys[slots[valid]]), (outputs * 255).astype(np.uint8), next_key
+
+    def _payloads(self, keys):
+        """
+        Decodes the whole payloads of keys in one forward pass, leaving out
+        the keys retrieve would not find.
+        """
+        found, key_rows = [], []
+        for key in keys:
+            rows = self._key_rows(key) if key in self else None
+            if rows is not None:
+                found.append(key)
+                key_rows.append(rows)
+        if not found:
+            return [], []
+        outputs = (self._reconstruct(np.concatenate(key_rows)) * 255).astype(np.uint8)
+        bounds = np.cumsum([len(rows) for rows in key_rows])[:-1]
+        return found, [output.reshape(-1)[:self.manifests.get(key)]
+                       for key, output in zip(found, np.split(outputs, bounds))]
+
+    def __len__(self):
+        slots = np.fromiter(self.memory.index.values(), dtype=np.int64, count=len(self.memory.index))
+        return int(np.count_nonzero(self._stamps[slots] != -2))
+
+    def __contains__(self, key):
+        slot = self.memory.index.get(key)
+        return slot is not None and self._stamps[slot] != -2
@@ -0,0 +1,313 @@
+import bisect
+import os
+import uuid
+
+import numpy as np
+
+# persisted key record: type tag, payload length, 16 payload bytes
+KEY_BYTES = 18
+_INT_KEY, _UUID_KEY, _STR_KEY, _BYTES_KEY = 1, 2, 3, 4
+
+
+def encode_key(key):
+    record = np.zeros(KEY_BYTES, dtype=np.uint8)
+    if isinstance(key, bool):
+        raise ValueError(f"Unsupported key type: {type(key).__name__}")
+    if isinstance(key, (int, np.integer)):
+        tag, payload = _INT_KEY, int(key).to_bytes(16, 'little', signed=True)
+    elif isinstance(key, uuid.UUID):
+        tag, payload = _UUID_KEY, key.bytes
+    elif isinstance(key, str):
+        tag, payload = _STR_KEY, key.encode('utf-8')
+    elif isinstance(key, bytes):
+        tag, payload = _BYTES_KEY, key
+    else:
+        raise ValueError(f"Unsupported key type: {type(key).__name__}")
+    if len(payload) > 16:
+        raise ValueError(f"Key too long to persist: {key!r}")
+    record[0] = tag
+    record[1] = len(payload)
+    record[2:2 + len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+    return record
+
+
+def decode_key(record):
+    tag, size = int(record[0]), int(record[1])
+    payload = record[2:2 + size].tobytes()
+    if tag == _INT_KEY:
+        return int.from_bytes(payload, 'little', signed=True)
+    if tag == _UUID_KEY:
+        return uuid.UUID(bytes=payload)
+    if tag == _STR_KEY:
+        return payload.decode('utf-8')
+    if tag == _BYTES_KEY:
+        return payload
+    raise ValueError(f"Corrupted key record with tag {tag}")
+
+
+class RingBuffer:
+    """
+    Fixed-capacity FIFO of equal-width rows kept in one preallocated array.
+    Rows are written at head in insertion order, so the i-th oldest row lives
+    in slot (oldest + i) % capacity and neighbour or range lookups are plain
+    index arithmetic. Writing a new key when full overwrites the oldest row.
+
+    With a path the arrays are .npy files opened through np.memmap, so the
+    rows can exceed RAM and an existing directory is reopened as it was left:
+    only the keys and sequence numbers are read to rebuild the index.
+    read_only maps an existing directory without write access, for readers
+    of a buffer another process writes; reload picks up its new rows.
+
+    discard leaves a hole in the ring that is only reused once head wraps
+    around to it; positional lookups and search still count the hole, so it
+    is meant for buffers read by key only.
+    """
+
+    def __init__(self, capacity, width, dtype=np.float32, scale=1.0, path=None, read_only=False):
+        self.capacity = capacity
+        self.width = width
+        self.path = path
+        self.scale = scale  # stored value * scale = float value, for quantized rows
+        self.read_only = read_only
+        if read_only and path is None:
+            raise ValueError("read_only needs a path")
+        if path is not None and not read_only:
+            os.makedirs(path, exist_ok=True)
+        self.rows = self._array('rows', (capacity, width), dtype, 0)
+        self.sq_norms = self._array('sq_norms', (capacity,), np.float32, 0)  # squared L2 norm of each float row
+        self.seqs = self._array('seqs', (capacity,), np.int64, -1)  # insertion sequence number per slot
+        # write counter value of each slot's last write, -1 while a row is being
+        # written; unlike seqs it also changes when a key is overwritten in place
+        self.stamps = self._array('stamps', (capacity,), np.int64, -1)
+        self.key_records = self._array('keys', (capacity, KEY_BYTES), np.uint8, 0) if path is not None else None
+        self.slot_keys = np.empty(capacity, dtype=object)
+        self.index = {}  # key -> slot
+        self.head = 0  # next slot to write
+        self.count = 0
+        self.next_seq = 0
+        self.next_stamp = 0
+        if path is not None:
+            self._recover()
+
+    def _array(self, name, shape, dtype, fill):
+        if self.path is None:
+            return np.full(shape, fill, dtype=dtype)
+        file = os.path.join(self.path, f"{name}.npy")
+        if os.path.exists(file) or self.read_only:
+            array = np.lib.format.open_memmap(file, mode='r' if self.read_only else 'r+')
+            if array.shape != shape or array.dtype != np.dtype(dtype):
+                raise ValueError(f"{file} holds {array.dtype}{array.shape}, expected {np.dtype(dtype)}{shape}")
+            return array
+        array = np.lib.format.open_memmap(file, mode='w+', dtype=dtype, shape=shape)
+        if fill:
+            array[:] = fill
+        return array
+
+    def reload(self):
+        """
+        Rebuilds the index from the arrays on disk, after another process wrote them.
+        """
+        self.slot_keys[:] = None
+        self.index = {}
+        self.head = self.count = self.next_seq = 0
+        self._recover()
+
+    def _recover(self):
+        self.next_stamp = int(self.stamps.max()) + 1
+        used = np.nonzero(self.seqs >= 0)[0]
+        if len(used) == 0:
+            return
+        for slot in used:
+            key = decode_key(self.key_records[slot])
+            self.slot_keys[slot] = key
+            self.index[key] = int(slot)
+        newest = int(used[np.argmax(self.seqs[used])])
+        oldest = int(used[np.argmin(self.seqs[used])])
+        self.head = (newest + 1) % self.capacity
+        # discarded slots between oldest and newest still count as written
+        self.count = (self.head - oldest) % self.capacity or self.capacity
+        self.next_seq = int(self.seqs[newest]) + 1
+
+    def flush(self):
+        """
+        Writes the memory-mapped arrays back to disk, no-op in memory.
+        """
+        if self.path is None or self.read_only:
+            return
+        for array in (self.rows, self.sq_norms, self.seqs, self.stamps, self.key_records):
+            array.flush()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        for pos in range(self.count):
+            yield self.slot_keys[(self.oldest + pos) % self.capacity]
+
+    def __getitem__(self, key):
+        slot = self.index[key]
+        return self.rows[slot:slot + 1]
+
+    @property
+    def oldest(self):
+        return (self.head - self.count) % self.capacity
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes
+
+    def validate_key(self, key):
+        """
+        Raises ValueError if key cannot be stored, which only happens when the
+        keys are persisted. Returns the key record, None in memory.
+        """
+        return encode_key(key) if self.key_records is not None else None
+
+    def put(self, key, row):
+        """
+        Writes row under key, an existing key is overwritten in place. Returns
+        the evicted key, or None if nothing was evicted. A key that cannot be
+        persisted raises ValueError before anything is changed.
+        """
+        record = self.validate_key(key)
+        slot = self.index.get(key)
+        if slot is not None:
+            self._write(slot, row)
+            return None
+        slot = self.head
+        # the slot reads as unused while its row is replaced
+        self.seqs[slot] = -1
+        self._write(slot, row)
+        evicted = None
+        if self.count == self.capacity:
+            evicted = self.slot_keys[slot]
+            if evicted is not None:
+                del self.index[evicted]
+        else:
+            self.count += 1
+        self.slot_keys[slot] = key
+        if record is not None:
+            self.key_records[slot] = record
+        # the sequence number is written last, it is what marks the slot as used
+        self.seqs[slot] = self.next_seq
+        self.index[key] = slot
+        self.next_seq += 1
+        self.head = (slot + 1) % self.capacity
+        return evicted
+
+    def discard(self, key):
+        """
+        Removes key, its slot stays a hole until the ring overwrites it.
+        Returns False if key was not stored.
+        """
+        slot = self.index.pop(key, None)
+        if slot is None:
+            return False
+        self.seqs[slot] = -1
+        self.slot_keys[slot] = None
+        return True
+
+    def _write(self, slot, row):
+        # readers holding an older index compare stamps to tell the row changed
+        self.stamps[slot] = -1
+        self.rows[slot] = row
+        vector = self.vectors(slot, slot + 1)[0]
+        self.sq_norms[slot] = np.dot(vector, vector)
+        self.stamps[slot] = self.next_stamp
+        self.next_stamp += 1
+
+    def vectors(self, start=0, stop=None):
+        """
+        Rows of the slots [start, stop) as float32.
+        """
+        rows = np.asarray(self.rows[start:stop], dtype=np.float32)
+        return rows * np.float32(self.scale) if self.scale != 1.0 else rows
+
+    def gather(self, slots):
+        """
+        Rows of the given slots as float32.
+        """
+        rows = np.asarray(self.rows[slots], dtype=np.float32)
+        return rows * np.float32(self.scale) if self.scale != 1.0 else rows
+
+    def search(self, queries, k, metric='mse', exclude=None, block_rows=65536):
+        """
+        Top-k stored rows for each query in a (Q, width) float batch, scanning
+        all rows as a matrix product in blocks of block_rows. metric 'mse' ranks
+        by mean squared error (ascending), 'cosine' by cosine similarity
+        (descending). exclude optionally gives one slot per query to skip.
+        Returns (slots, scores), both (Q, k), best first.
+        """
+        if metric not in ('mse', 'cosine'):
+            raise ValueError(f"Unsupported metric: {metric}")
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, self.count)
+        q_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        best_slots = np.empty((len(queries), 0), dtype=np.int64)
+        best_dists = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, self.count, block_rows):
+            stop = min(start + block_rows, self.count)
+            dots = queries @ self.vectors(start, stop).T
+            if metric == 'mse':
+                dists = np.maximum(q_sq_norms[:, None] + self.sq_norms[None, start:stop] - 2 * dots, 0) / self.width
+            else:
+                norms = np.sqrt(q_sq_norms)[:, None] * np.sqrt(self.sq_norms[None, start:stop])
+                dists = -dots / np.maximum(norms, 1e-12)
+            if exclude is not None:
+                for i, slot in enumerate(exclude):
+                    if start <= slot < stop:
+                        dists[i, slot - start] = np.inf
+            slots = np.broadcast_to(np.arange(start, stop), dists.shape)
+            dists = np.concatenate([best_dists, dists], axis=1)
+            slots = np.concatenate([best_slots, slots], axis=1)
+            if dists.shape[1] > k:
+                top = np.argpartition(dists, k - 1, axis=1)[:, :k]
+                dists = np.take_along_axis(dists, top, axis=1)
+                slots = np.take_along_axis(slots, top, axis=1)
+            best_dists, best_slots = dists, slots
+
+        order = np.argsort(best_dists, axis=1)
+        best_slots = np.take_along_axis(best_slots, order, axis=1)
+        best_dists = np.take_along_axis(best_dists, order, axis=1)
+        return best_slots, best_dists if metric == 'mse' else -best_dists
+
+    def position(self, key):
+        """
+        Insertion-order position of key, 0 being the oldest stored key.
+        """
+        return (self.index[key] - self.oldest) % self.capacity
+
+    def key_at(self, position):
+        return self.slot_keys[(self.oldest + position) % self.capacity]
+
+    def bisect(self, key):
+        """
+        Position of the first stored key >= key, by binary search over the
+        insertion order, so only meaningful when keys are stored increasing.
+        """
+        return bisect.bisect_left(range(self.count), key, key=self.key_at)
+
+    def seq(self, key):
+        return int(self.seqs[self.index[key]])
+
+    def neighbours(self, key):
+        """
+        Keys stored just before and after key, None at either end.
+        """
+        position = self.position(key)
+        prev_key = self.key_at(position - 1) if position > 0 else None
+        next_key = self.key_at(position + 1) if position < self.count - 1 else None
+        return prev_key, next_key
+
+    def positions_to_slots(self, start, stop):
+        """
+        Slots of the insertion-order positions [start, stop).
+        """
+        return (self.oldest + np.arange(start, stop)) % self.capacity
@@ -0,0 +1,259 @@
+import bisect
+import hashlib
+import heapq
+import multiprocessing
+import threading
+
+import numpy as np
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class ConsistentHashRing:
+    """
+    Maps keys to nodes, each node owning vnodes points on a 64-bit hash ring.
+    Adding or removing a node only moves the keys of the ring arcs it owns.
+    """
+
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self.points = []  # sorted (hash, node)
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.vnodes):
+            bisect.insort(self.points, (_hash(f"{node}#{i}"), node))
+
+    def remove(self, node):
+        self.points = [point for point in self.points if point[1] != node]
+
+    def node_for(self, key):
+        if not self.points:
+            raise ValueError("Hash ring has no nodes")
+        idx = bisect.bisect(self.points, (_hash(key),))
+        return self.points[idx % len(self.points)][1]
+
+
+class _SortedKeys:
+    """
+    Keys stored through a shard, kept sorted so a range page is a bisect and
+    a walk over at most limit keys. Keys the ring has evicted since are
+    dropped when a page walks over them, and all at once whenever they would
+    make up over half the list, so it stays within twice the ring's capacity.
+    Keys must be mutually comparable.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.keys = sorted(storage.memory.index)
+
+    def add(self, keys):
+        for key in keys:
+            idx = bisect.bisect_left(self.keys, key)
+            if idx == len(self.keys) or self.keys[idx] != key:
+                self.keys.insert(idx, key)
+        if len(self.keys) > 2 * len(self.storage.memory):
+            self.keys = [key for key in self.keys if key in self.storage.memory]
+
+    def page(self, key_from, key_to_exclude, limit=None):
+        found = []
+        idx = bisect.bisect_left(self.keys, key_from)
+        while idx < len(self.keys) and self.keys[idx] < key_to_exclude and (limit is None or len(found) < limit):
+            if self.keys[idx] in self.storage.memory:
+                found.append(self.keys[idx])
+                idx += 1
+            else:
+                del self.keys[idx]
+        return found
+
+
+def _discard(*results):
+    return None
+
+
+def _shard_main(conn, storage_kwargs):
+    # runs in the shard process, which owns its own NeuralStorage singleton
+    from neuronalMemory.neuronalMemory import NeuralStorage
+    storage = NeuralStorage(**storage_kwargs)
+    sorted_keys = _SortedKeys(storage)
+    handlers = {
+        # stores return tensors, only their side effect crosses the pipe
+        'store': lambda key, data: _discard(storage.store(key, data), sorted_keys.add([key])),
+        'store_many': lambda keys, datas: _discard(storage.store_many(keys, datas), sorted_keys.add(keys)),
+        'retrieve': storage.retrieve,
+        'retrieve_many': storage.retrieve_many,
+        'range_keys': sorted_keys.page,
+        'input_vectors': storage.input_vectors,
+        'get_nearby': storage.get_nearby,
+        'query_similar': storage.query_similar,
+        'len': lambda: len(storage.memory),
+    }
+    while True:
+        request = conn.recv()
+        if request is None:
+            conn.close()
+            return
+        method, args = request
+        try:
+            conn.send(('ok', handlers[method](*args)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class ShardedStorage:
+    """
+    Spreads keys over shards worker processes, each owning an independent
+    NeuralStorage built from storage_kwargs, so training runs on as many
+    cores as there are shards. Keys are routed by a consistent-hash ring;
+    range and similarity queries are sent to every shard and merged.
+    """
+
+    def __init__(self, shards=2, vnodes=64, **storage_kwargs):
+        # defaults as in NeuralStorage, for results built without the shards
+        self.input_size = storage_kwargs.get('input_size', 1024)
+        self.chunking = storage_kwargs.get('chunking', False)
+        # spawn: TensorFlow does not survive a fork of an initialised parent
+        context = multiprocessing.get_context('spawn')
+        self.ring = ConsistentHashRing(range(shards), vnodes)
+        self.conns = []
+        self.processes = []
+        self.locks = []
+        for _ in range(shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_shard_main, args=(child_conn, storage_kwargs), daemon=True)
+            process.start()
+            child_conn.close()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+            self.locks.append(threading.Lock())
+
+    def _call_many(self, requests):
+        """
+        Sends {shard: (method, args)} to all shards first, then collects the
+        replies, so the shards work in parallel.
+        """
+        shards = sorted(requests)
+        for shard in shards:
+            self.locks[shard].acquire()
+        try:
+            for shard in shards:
+                self.conns[shard].send(requests[shard])
+            replies = {shard: self.conns[shard].recv() for shard in shards}
+        finally:
+            for shard in shards:
+                self.locks[shard].release()
+        results = {}
+        for shard, (status, result) in replies.items():
+            if status != 'ok':
+                raise RuntimeError(f"shard {shard}: {result}")
+            results[shard] = result
+        return results
+
+    def _call(self, shard, method, *args):
+        return self._call_many({shard: (method, args)})[shard]
+
+    def _scatter(self, method, *args):
+        return self._call_many({shard: (method, args) for shard in range(len(self.conns))})
+
+    def shard_for(self, key):
+        return self.ring.node_for(key)
+
+    def store(self, key, data):
+        self._call(self.shard_for(key), 'store', key, data)
+
+    def store_many(self, keys, datas):
+        groups = {}
+        for key, data in zip(keys, datas):
+            shard_keys, shard_datas = groups.setdefault(self.shard_for(key), ([], []))
+            shard_keys.append(key)
+            shard_datas.append(data)
+        self._call_many({shard: ('store_many', group) for shard, group in groups.items()})
+
+    def retrieve(self, key):
+        return self._call(self.shard_for(key), 'retrieve', key)
+
+    def retrieve_many(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.shard_for(key), []).append(key)
+        results = self._call_many({shard: ('retrieve_many', (shard_keys,)) for shard, shard_keys in groups.items()})
+        decoded = {}
+        for found, outputs in results.values():
+            decoded.update(zip(found, outputs))
+        found = [key for key in keys if key in decoded]
+        if self.chunking:
+            return found, [decoded[key] for key in found]
+        if not found:
+            return [], np.empty((0, self.input_size), dtype=np.uint8)
+        return found, np.stack([decoded[key] for key in found])
+
+    def retrieve_range(self, key_from, key_to_exclude, limit=None):
+        """
+        Same range as NeuralStorage.retrieve_range, merged across shards by
+        key value from sorted per-shard indexes. Every shard returns
+        its lowest limit + 1 keys in [key_from, key_to_exclude) from a sorted
+        index, and only the lowest limit of the merged keys are decoded, by
+        the shards owning them.
+        """
+        pages = self._scatter('range_keys', key_from, key_to_exclude, None if limit is None else limit + 1)
+        merged = list(heapq.merge(*pages.values()))
+        next_key = None
+        if limit is not None and len(merged) > limit:
+            next_key = merged[limit]
+            merged = merged[:limit]
+        found, outputs = self.retrieve_many(merged)
+        return found, outputs, next_key
+
+    def get_nearby(self, center_key):
+        # neighbours are defined by insertion order, which only exists within a shard
+        return self._call(self.shard_for(center_key), 'get_nearby', center_key)
+
+    def query_similar(self, data_or_key, k=5, metric='mse'):
+        """
+        Top-k over every shard, merged by score, per query when data_or_key
+        is a list. A stored key is looked up by the shard owning it, the
+        others are queried with its row in input space. Scores come from each
+        shard's own model, so in latent mode they are only roughly comparable.
+        """
+        batched = isinstance(data_or_key, list)
+        queries = data_or_key if batched else [data_or_key]
+        if not queries:
+            return []
+        shard_queries = {shard: list(queries) for shard in range(len(self.conns))}
+        key_queries = {}
+        for i, query in enumerate(queries):
+            if not isinstance(query, (bytes, str, np.ndarray)):
+                key_queries.setdefault(self.shard_for(query), []).append(i)
+        if key_queries:
+            vectors = self._call_many({owner: ('input_vectors', ([queries[i] for i in positions],))
+                                       for owner, positions in key_queries.items()})
+            for owner, positions in key_queries.items():
+                found, rows = vectors[owner]
+                if len(found) != len(positions):
+                    missing = next(queries[i] for i in positions if queries[i] not in found)
+                    raise ValueError(f"Key {missing!r} is not stored")
+                for i, row in zip(positions, rows):
+                    for shard in shard_queries:
+                        if shard != owner:
+                            shard_queries[shard][i] = row
+        results = self._call_many({shard: ('query_similar', (shard_queries[shard], k, metric))
+                                   for shard in shard_queries})
+        reverse = metric == 'cosine'
+        merged = []
+        for i in range(len(queries)):
+            candidates = [match for shard_results in results.values() for match in shard_results[i]]
+            merged.append(sorted(candidates, key=lambda match: match[1], reverse=reverse)[:k])
+        return merged if batched else merged[0]
+
+    def __len__(self):
+        return sum(self._scatter('len').values())
+
+    def close(self):
+        for conn, lock in zip(self.conns, self.locks):
+            with lock:
+                conn.send(None)
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from neuronalMemory.neuronalMemory import NeuralStorage
+from util.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_resident = registry.gauge("storage_registry_resident", "Named storages held in memory")
+_loads = registry.counter("storage_registry_loads_total", "Named storages built or reloaded from disk")
+_evictions = registry.counter("storage_registry_evictions_total", "Named storages checkpointed and dropped")
+
+
+class StorageRegistry:
+    """
+    Named, independent NeuralStorage instances, one per stream or tenant, so
+    unrelated streams do not train the same weights. An instance is built on
+    first use from defaults overridden by configure(name, ...), persisted
+    under root_dir/name. At most max_resident stay in memory: the least
+    recently used one is checkpointed and dropped to make room, and so is
+    any instance unused for idle_seconds. Dropped instances reload from
+    their checkpoint on the next get.
+    """
+
+    def __init__(self, root_dir, max_resident=8, idle_seconds=None, **defaults):
+        if max_resident < 1:
+            raise ValueError("max_resident must be at least 1")
+        self.root_dir = root_dir
+        self.max_resident = max_resident
+        self.idle_seconds = idle_seconds
+        self.defaults = defaults
+        self.configs = {}
+        # name -> storage, least recently used first
+        self.resident = OrderedDict()
+        self.last_used = {}
+        self.pins = {}
+        self._lock = threading.RLock()
+        _resident.set_function(lambda: len(self.resident))
+
+    def configure(self, name, **kwargs):
+        """
+        Sets the NeuralStorage arguments of name (input_size, memory_capacity,
+        ...) on top of the registry defaults. Takes effect on the next load.
+        """
+        with self._lock:
+            self.configs[name] = kwargs
+
+    def names(self):
+        """
+        Every name known, resident, configured or persisted under root_dir.
+        """
+        with self._lock:
+            names = set(self.resident) | set(self.configs)
+        if os.path.isdir(self.root_dir):
+            names.update(entry for entry in os.listdir(self.root_dir)
+                         if os.path.isdir(os.path.join(self.root_dir, entry)))
+        return sorted(names)
+
+    def get(self, name):
+        """
+        Returns the storage of name, building or reloading it if needed.
+        """
+        with self._lock:
+            self.evict_idle()
+            storage = self.resident.get(name)
+            if storage is None:
+                self._make_room()
+                kwargs = dict(self.defaults, **self.configs.get(name, {}))
+                kwargs['persist_dir'] = os.path.join(self.root_dir, name)
+                storage = NeuralStorage.detached(**kwargs)
+                self.resident[name] = storage
+                _loads.inc()
+                logger.info(f"Loaded storage {name}")
+            self.resident.move_to_end(name)
+            self.last_used[name] = time.monotonic()
+            return storage
+
+    @contextmanager
+    def using(self, name):
+        """
+        get, keeping the storage from being evicted until the block exits.
+        """
+        with self._lock:
+            storage = self.get(name)
+            self.pins[name] = self.pins.get(name, 0) + 1
+        try:
+            yield storage
+        finally:
+            with self._lock:
+                self.pins[name] -= 1
+                if not self.pins[name]:
+                    del self.pins[name]
+                self.last_used[name] = time.monotonic()
+
+    def _make_room(self):
+        for name in list(self.resident):
+            if len(self.resident) < self.max_resident:
+                return
+            if name not in self.pins:
+                self.evict(name)
+        if len(self.resident) >= self.max_resident:
+            logger.warning(f"All {len(self.resident)} resident storages are in use, exceeding max_resident")
+
+    def evict(self, name):
+        """
+        Trains pending items, checkpoints name to disk and drops it from memory.
+        Returns False if name was not resident or is in use.
+        """
+        with self._lock:
+            storage = self.resident.get(name)
+            if storage is None or name in self.pins:
+                return False
+            storage.flush()
+            storage.checkpoint()
+            del self.resident[name]
+            del self.last_used[name]
+            _evictions.inc()
+            logger.info(f"Evicted storage {name}")
+            return True
+
+    def evict_idle(self):
+        """
+        Evicts every storage unused for idle_seconds, returns their names.
+        """
+        if self.idle_seconds is None:
+            return []
+        with self._lock:
+            deadline = time.monotonic() - self.idle_seconds
+            idle = [name for name, used in self.last_used.items() if used < deadline]
+            return [name for name in idle if self.evict(name)]
+
+    def close(self):
+        """
+        Checkpoints and drops every resident storage.
+        """
+        with self._lock:
+            self.pins.clear()
+            for name in list(self.resident):
+                self.evict(name)
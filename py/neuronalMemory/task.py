@@ -1,42 +1,226 @@
 import asyncio
+import functools
+import heapq
+import inspect
 import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from util.metrics import registry
 from util.singleton import singleton
 
 
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block', 'reject')
+
+
+class _PriorityTaskQueue(asyncio.Queue):
+    """
+    asyncio.Queue ordered by task priority (higher first), then by task id.
+    """
+
+    def _init(self, maxsize):
+        self._queue = []
+
+    def _put(self, task):
+        heapq.heappush(self._queue, (-task['priority'], task['id'], task))
+
+    def _get(self):
+        return heapq.heappop(self._queue)[2]
+
+    def reprioritize(self, task):
+        for i, (_, task_id, queued) in enumerate(self._queue):
+            if queued is task:
+                self._queue[i] = (-task['priority'], task_id, task)
+                heapq.heapify(self._queue)
+                return
+
+    def pop_lowest(self):
+        """
+        Removes and returns the oldest of the lowest-priority tasks, the one
+        drop_oldest sacrifices. Like get_nowait, task_done is still owed.
+        """
+        victim = max(range(len(self._queue)), key=lambda i: (self._queue[i][0], -self._queue[i][1]))
+        entry = self._queue[victim]
+        self._queue[victim] = self._queue[-1]
+        self._queue.pop()
+        heapq.heapify(self._queue)
+        self._wakeup_next(self._putters)
+        return entry[2]
+
+
 @singleton
 class TaskQueue:
-    def __init__(self, max_size=12000):
-        self.queue = asyncio.Queue(maxsize=max_size)
+    """
+    Bounded priority queue of tasks consumed by worker coroutines. Coroutine
+    functions are awaited on the loop, plain callables run on a thread or
+    process pool when executor is 'thread' or 'process' (process tasks must be
+    picklable), so CPU-bound work such as NeuralStorage.store does not block
+    the loop.
+
+    Tasks run by priority, highest first. A task added with the coalesce_key
+    of a still pending task replaces that task's call and shares its future,
+    so repeated writes for one key run once. overflow decides what add does
+    on a full queue: 'drop_oldest' discards the oldest lowest-priority task,
+    'drop_newest' discards the new one, 'block' waits for room and 'reject'
+    raises asyncio.QueueFull. Every outcome is counted in stats.
+    """
+
+    def __init__(self, max_size=12000, workers=1, executor=None, max_workers=None, overflow='drop_oldest'):
+        if executor not in (None, 'thread', 'process'):
+            raise ValueError(f"Unsupported executor: {executor}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported overflow policy: {overflow}")
+        self.queue = _PriorityTaskQueue(maxsize=max_size)
         self.task_id_counter = 0
+        self.workers = workers
+        self.executor = executor
+        self.max_workers = max_workers or workers
+        self.overflow = overflow
+        self.stats = {'added': 0, 'coalesced': 0, 'dropped_oldest': 0, 'dropped_newest': 0,
+                      'rejected': 0, 'blocked': 0, 'completed': 0, 'failed': 0}
+        self._counters = {name: registry.counter(f"taskqueue_{name}_total", f"Tasks {name.replace('_', ' ')}")
+                          for name in self.stats}
+        self._wait_seconds = registry.histogram("taskqueue_wait_seconds", "Time from enqueue to start")
+        self._run_seconds = registry.histogram("taskqueue_run_seconds", "Time from start to finish")
+        registry.gauge("taskqueue_depth", "Pending tasks").set_function(lambda: self.queue.qsize())
+        self._pending_by_key = {}
+        self._pool = None
+        self._worker_tasks = []
+        self._closing = False
+
+    async def add(self, task_func, *args, priority=0, coalesce_key=None, **kwargs):
+        """
+        Enqueues task_func(*args, **kwargs) and returns a future of its result.
+        """
+        if self._closing:
+            raise RuntimeError("TaskQueue is shutting down")
+        loop = asyncio.get_running_loop()
+
+        pending = self._pending_by_key.get(coalesce_key) if coalesce_key is not None else None
+        if pending is not None:
+            pending['func'], pending['args'], pending['kwargs'] = task_func, args, kwargs
+            if priority > pending['priority']:
+                pending['priority'] = priority
+                self.queue.reprioritize(pending)
+            self._count('coalesced')
+            return pending['future']
 
-    async def add(self, task_func, *args, **kwargs):
         task_id = self.task_id_counter
         self.task_id_counter += 1
-        if self.queue.full():
-            old_task = await self.queue.get()
         task = {
             'id': task_id,
             'func': task_func,
             'args': args,
-            'kwargs': kwargs
+            'kwargs': kwargs,
+            'priority': priority,
+            'coalesce_key': coalesce_key,
+            'future': loop.create_future(),
+            'enqueued_at': time.monotonic()
         }
-        await self.queue.put(task)
+        if self.queue.full():
+            if self.overflow == 'drop_oldest':
+                self._discard(self.queue.pop_lowest())
+                self._count('dropped_oldest')
+            elif self.overflow == 'drop_newest':
+                task['future'].cancel()
+                self._count('dropped_newest')
+                return task['future']
+            elif self.overflow == 'reject':
+                self._count('rejected')
+                raise asyncio.QueueFull()
+            else:
+                self._count('blocked')
+        try:
+            await self.queue.put(task)
+        except asyncio.CancelledError:
+            task['future'].cancel()
+            raise
+        # registered once queued, a put cancelled while blocked leaves nothing to coalesce into
+        if coalesce_key is not None and coalesce_key not in self._pending_by_key:
+            self._pending_by_key[coalesce_key] = task
+        self._count('added')
+        return task['future']
+
+    def _count(self, name):
+        self.stats[name] += 1
+        self._counters[name].inc()
+
+    def _discard(self, task):
+        self._forget(task)
+        task['future'].cancel()
+        self.queue.task_done()
+
+    def _forget(self, task):
+        if self._pending_by_key.get(task['coalesce_key']) is task:
+            del self._pending_by_key[task['coalesce_key']]
+
+    async def start(self):
+        """
+        Starts the worker coroutines and the executor, if not running yet.
+        """
+        if self._worker_tasks:
+            return
+        self._closing = False
+        if self.executor == 'thread':
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        elif self.executor == 'process':
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._worker_tasks = [asyncio.create_task(self.exec()) for _ in range(self.workers)]
+
+    async def shutdown(self, drain=True):
+        """
+        Stops accepting tasks, waits for the pending ones if drain is set,
+        otherwise cancels them, then stops the workers and the executor.
+        """
+        self._closing = True
+        if drain:
+            await self.queue.join()
+        else:
+            while not self.queue.empty():
+                self._discard(self.queue.get_nowait())
+        for worker in self._worker_tasks:
+            worker.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
 
     async def exec(self):
         while True:
             task = await self.queue.get()
-            task_id = task['id']
-            func = task['func']
-            args = task['args']
-            kwargs = task['kwargs']
+            self._forget(task)
+            future = task['future']
+            started_at = time.monotonic()
+            self._wait_seconds.observe(started_at - task['enqueued_at'])
             try:
-                await func(*args, **kwargs)
+                if not future.cancelled():
+                    future.set_result(await self._call(task['func'], task['args'], task['kwargs']))
+                self._count('completed')
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
             except Exception as e:
-                print(e)
-                pass
+                self._count('failed')
+                logging.exception(f"Task {task['id']} failed")
+                if not future.cancelled():
+                    future.set_exception(e)
+                    # already logged, keep asyncio from reporting it again if nobody awaits it
+                    future.exception()
             finally:
+                self._run_seconds.observe(time.monotonic() - started_at)
                 self.queue.task_done()
 
+    async def _call(self, func, args, kwargs):
+        if inspect.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        if self._pool is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, functools.partial(func, *args, **kwargs))
+        result = func(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
     async def run(self):
         await self.queue.join()
 
@@ -0,0 +1,137 @@
+import io
+import struct
+
+import numpy as np
+
+OCTET_STREAM = 'application/octet-stream'
+NPY = 'application/x-npy'
+SHAPE_HEADER = 'X-Tensor-Shape'
+DTYPE_HEADER = 'X-Tensor-Dtype'
+
+DTYPES = {name: np.dtype(name) for name in
+          ('float16', 'float32', 'float64', 'uint8', 'int8', 'int16', 'int32', 'int64')}
+DTYPE_CODES = list(DTYPES)
+
+# stream frame: stream id, key, dtype code, ndim, then ndim uint32 dims and the payload
+FRAME_HEADER = struct.Struct('<IqBB')
+
+
+def parse_shape(shape):
+    """
+    Parses a shape header such as "32,32" or "1024".
+    """
+    try:
+        dims = [int(dim) for dim in shape.split(',') if dim.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid tensor shape: {shape!r}")
+    if not dims or any(dim <= 0 for dim in dims):
+        raise ValueError(f"Invalid tensor shape: {shape!r}")
+    return dims
+
+
+def all_finite(array):
+    """
+    False if a float array holds NaN or infinity, which would poison every
+    weight trained on it.
+    """
+    return array.dtype.kind != 'f' or bool(np.isfinite(array).all())
+
+
+def _finite(array):
+    if not all_finite(array):
+        raise ValueError("Tensor data must be finite")
+    return array
+
+
+def decode_raw(body, shape, dtype='float32'):
+    """
+    Views a raw little-endian buffer as an array of the given shape and dtype
+    without copying it. The returned array is read-only, float data must be finite.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported tensor dtype: {dtype}")
+    dims = parse_shape(shape) if isinstance(shape, str) else [int(dim) for dim in shape]
+    if not dims or any(dim <= 0 for dim in dims):
+        raise ValueError(f"Invalid tensor shape: {dims}")
+    dt = DTYPES[dtype].newbyteorder('<')
+    expected = int(np.prod(dims)) * dt.itemsize
+    if len(body) != expected:
+        raise ValueError(f"Tensor body has {len(body)} bytes, shape {dims} of {dtype} needs {expected}")
+    return _finite(np.frombuffer(body, dtype=dt).reshape(dims))
+
+
+def decode_npy(body):
+    """
+    Views the payload of a .npy file without copying it, float data must be finite.
+    """
+    stream = io.BytesIO(body)
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    else:
+        raise ValueError(f"Unsupported .npy version: {version}")
+    # same dtypes as a raw body, either byte order
+    if dtype.name not in DTYPES:
+        raise ValueError(f"Unsupported tensor dtype: {dtype}")
+    count = int(np.prod(shape))
+    if len(body) - stream.tell() != count * dtype.itemsize:
+        raise ValueError("Truncated .npy payload")
+    array = np.frombuffer(body, dtype=dtype, count=count, offset=stream.tell())
+    return _finite(array.reshape(shape, order='F' if fortran_order else 'C'))
+
+
+def decode_body(body, content_type, shape=None, dtype=None):
+    """
+    Decodes a request body by its content type, raw buffers need the shape
+    and dtype headers.
+    """
+    content_type = (content_type or '').split(';')[0].strip()
+    if content_type == NPY:
+        return decode_npy(body)
+    if content_type == OCTET_STREAM:
+        if shape is None:
+            raise ValueError(f"{SHAPE_HEADER} header is required")
+        return decode_raw(body, shape, dtype or 'float32')
+    raise ValueError(f"Unsupported content type: {content_type}")
+
+
+def encode_frame(stream_id, key, array):
+    """
+    Packs one tensor into a stream frame, several frames may be concatenated
+    into one message.
+    """
+    array = np.ascontiguousarray(array)
+    dtype = array.dtype.name
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported tensor dtype: {dtype}")
+    header = FRAME_HEADER.pack(stream_id, key, DTYPE_CODES.index(dtype), array.ndim)
+    dims = struct.pack(f'<{array.ndim}I', *array.shape)
+    return header + dims + array.astype(array.dtype.newbyteorder('<'), copy=False).tobytes()
+
+
+def iter_frames(message):
+    """
+    Yields (stream_id, key, array) for every frame of a message, the arrays
+    are read-only views into message. Their values are not checked, see all_finite.
+    """
+    offset = 0
+    while offset < len(message):
+        if len(message) - offset < FRAME_HEADER.size:
+            raise ValueError("Truncated frame header")
+        stream_id, key, code, ndim = FRAME_HEADER.unpack_from(message, offset)
+        offset += FRAME_HEADER.size
+        if code >= len(DTYPE_CODES):
+            raise ValueError(f"Unknown dtype code: {code}")
+        if len(message) - offset < 4 * ndim:
+            raise ValueError("Truncated frame shape")
+        dims = struct.unpack_from(f'<{ndim}I', message, offset)
+        offset += 4 * ndim
+        dtype = DTYPES[DTYPE_CODES[code]].newbyteorder('<')
+        count = int(np.prod(dims))
+        if len(message) - offset < count * dtype.itemsize:
+            raise ValueError("Truncated frame payload")
+        array = np.frombuffer(message, dtype=dtype, count=count, offset=offset).reshape(dims)
+        offset += count * dtype.itemsize
+        yield stream_id, key, array
@@ -1,26 +1,65 @@
-from typing import List
-from pydantic import BaseModel, model_validator
+from typing import Annotated, List
+
+import numpy as np
+from pydantic import BaseModel, PlainSerializer, PlainValidator, WithJsonSchema, model_validator
+
+
+def _to_float_array(data):
+    """
+    Accepts a flat list of finite numbers, as List[float] would, without
+    NumPy's coercion of None, scalars, strings or nested lists.
+    """
+    if isinstance(data, np.ndarray):
+        if data.ndim != 1 or data.dtype.kind not in 'iuf':
+            raise ValueError("data must be a list of numbers")
+        array = data.astype(np.float32)
+    else:
+        if not isinstance(data, list) or not all(type(x) in (int, float) for x in data):
+            raise ValueError("data must be a list of numbers")
+        try:
+            # out of float32 range becomes inf and is rejected below
+            with np.errstate(over='ignore'):
+                array = np.array(data, dtype=np.float32)
+        except OverflowError:
+            raise ValueError("data must be finite")
+    if not np.isfinite(array).all():
+        raise ValueError("data must be finite")
+    return array
+
+
+FloatArray = Annotated[
+    np.ndarray,
+    PlainValidator(_to_float_array),
+    PlainSerializer(lambda data: data.tolist(), return_type=List[float]),
+    WithJsonSchema({'type': 'array', 'items': {'type': 'number'}}),
+]
+
 
 class NetTensor(BaseModel):
     shape: List[int]
-    data: List[float]
+    data: FloatArray
 
     @model_validator(mode='after')
     def validate_tensor(self) -> 'NetTensor':
         if not all(x > 0 for x in self.shape):
             self.shape = []
-            self.data = []
+            self.data = np.empty(0, dtype=np.float32)
             return self
 
-        expected_size = 1
-        for dim in self.shape:
-            expected_size *= dim
-
-        current_size = len(self.data)
+        expected_size = int(np.prod(self.shape))
+        current_size = self.data.size
         if current_size != expected_size:
-            if current_size < expected_size:
-                self.data.extend([0.0] * (expected_size - current_size))
-            else:
-                self.data = self.data[:expected_size]
+            resized = np.zeros(expected_size, dtype=np.float32)
+            kept = min(current_size, expected_size)
+            resized[:kept] = self.data[:kept]
+            self.data = resized
 
         return self
+
+    def as_array(self):
+        """
+        The data as a float32 array of the tensor's shape.
+        """
+        if not self.shape:
+            return self.data
+        return self.data.reshape(self.shape)
@@ -1,22 +1,160 @@
-from fastapi import APIRouter
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from remote.binaryTensor import DTYPE_HEADER, SHAPE_HEADER, all_finite, decode_body, encode_frame, iter_frames
 from remote.netTensor import NetTensor
 from neuronalMemory.neuronalMemory import NeuralStorage
 from neuronalMemory.task import TaskQueue
 
 rRouter = APIRouter()
 
+# frames a stream connection may have in flight before it has to wait for acks
+STREAM_CREDITS = 256
+# most keys decoded and returned by one /reduction/get page
+MAX_RANGE_LIMIT = 4096
+NEXT_KEY_HEADER = 'X-Next-Key'
+# seconds a client is told to wait when the ingest queue is full
+RETRY_AFTER_SECONDS = 1
+
+# what the endpoints serve: the NeuralStorage singleton unless set_storage installed another one
+_storage = None
+
+
+def set_storage(backend):
+    global _storage
+    _storage = backend
+
+
+def storage():
+    return _storage if _storage is not None else NeuralStorage()
+
+
+async def _enqueue_store(key, tensor):
+    try:
+        await TaskQueue().add(storage().store, key, tensor, coalesce_key=key)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="ingest queue is full",
+                            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
 
 @rRouter.post("/reduction/save")
-def save_tensor(key: int, tensor: NetTensor):
-    TaskQueue().add(NeuralStorage().store, key, tensor)
+async def save_tensor(key: int, tensor: NetTensor):
+    await _enqueue_store(key, tensor.as_array().reshape(-1))
+
+
+@rRouter.post("/reduction/save/binary")
+async def save_binary_tensor(key: int, request: Request):
+    """
+    Binary variant of /reduction/save: the body is either a raw buffer
+    (application/octet-stream with X-Tensor-Shape and X-Tensor-Dtype headers)
+    or a .npy file (application/x-npy), viewed in place with np.frombuffer.
+    """
+    body = await request.body()
+    try:
+        tensor = decode_body(body, request.headers.get('content-type'),
+                             request.headers.get(SHAPE_HEADER), request.headers.get(DTYPE_HEADER))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await _enqueue_store(key, tensor.reshape(-1))
+
+
+@rRouter.websocket("/reduction/stream")
+async def stream_tensors(websocket: WebSocket):
+    """
+    Persistent ingestion: every binary message carries one or more frames
+    (see binaryTensor.encode_frame) from any number of streams. Stream ids
+    only label frames for acks: keys are the same storage keys as in
+    /reduction/save, so they must increase across the whole connection, a
+    frame whose key is not above every key sent before is rejected, and so is
+    a frame of float data that is not finite. The frames of a message are
+    stored as one store_many task. The server starts by granting
+    STREAM_CREDITS frames; when a task finishes it sends {"acked": {stream:
+    last key}, "credits": n, "rejected": n, "error": ...} giving the credits
+    of that message back. Sending more frames than granted closes the
+    connection.
+    """
+    await websocket.accept()
+    await websocket.send_json({"credits": STREAM_CREDITS})
+    window = {"credits": STREAM_CREDITS}
+    last_key = -2 ** 63
+    acks = asyncio.Queue()
+    sender = asyncio.create_task(_send_stream_acks(websocket, acks, window))
+    try:
+        while True:
+            message = await websocket.receive_bytes()
+            keys, tensors, acked, rejected = [], [], {}, 0
+            try:
+                for stream_id, key, tensor in iter_frames(message):
+                    if key <= last_key or not all_finite(tensor):
+                        rejected += 1
+                        continue
+                    last_key = acked[stream_id] = key
+                    keys.append(key)
+                    tensors.append(tensor.reshape(-1))
+            except ValueError as e:
+                await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA, reason=str(e))
+                return
+            frames = len(keys) + rejected
+            window["credits"] -= frames
+            if window["credits"] < 0:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="credits exceeded")
+                return
+            future = None
+            if keys:
+                try:
+                    future = await TaskQueue().add(storage().store_many, keys, tensors)
+                except asyncio.QueueFull:
+                    future = None
+                    acked, rejected = {}, frames
+            await acks.put((future, acked, frames, rejected))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+
+
+async def _send_stream_acks(websocket: WebSocket, acks: asyncio.Queue, window):
+    while True:
+        future, acked, frames, rejected = await acks.get()
+        ack = {"acked": {str(stream_id): key for stream_id, key in acked.items()},
+               "credits": frames, "rejected": rejected}
+        if future is not None:
+            await asyncio.wait([future])
+            if future.cancelled():
+                ack["acked"], ack["rejected"], ack["error"] = {}, frames, "dropped"
+            elif future.exception() is not None:
+                ack["acked"], ack["rejected"], ack["error"] = {}, frames, str(future.exception())
+        window["credits"] += frames
+        await websocket.send_json(ack)
 
 
 @rRouter.get("/reduction/get")
-def get_tensor(key_from: int, key_to_exclude: int):
-    tensors = []
-    NeuralStorage.retrieve(key_from)
+async def get_tensor(key_from: int, key_to_exclude: int, limit: int = Query(1024, gt=0, le=MAX_RANGE_LIMIT),
+                     format: str = Query('binary', pattern='^(binary|ndjson)$')):
+    """
+    Streams the decoded memories from key_from up to key_to_exclude, at most
+    limit per call. binary sends one stream frame (binaryTensor.encode_frame,
+    stream id 0) of uint8 per key, ndjson one {"key", "data"} line per key,
+    holding the whole payload of a chunked key.
+    X-Next-Key is set when the range continues past this page. The bounds
+    are key values, not necessarily stored keys, and keys come in increasing
+    order, which relies on keys being stored increasing as /reduction/stream
+    requires.
+    """
+    keys, outputs, next_key = await run_in_threadpool(storage().retrieve_range, key_from, key_to_exclude, limit)
+    headers = {NEXT_KEY_HEADER: str(next_key)} if next_key is not None else {}
+    if format == 'ndjson':
+        lines = (json.dumps({"key": int(key), "data": output.tolist()}) + "\n" for key, output in zip(keys, outputs))
+        return StreamingResponse(lines, media_type='application/x-ndjson', headers=headers)
+    frames = (encode_frame(0, int(key), output) for key, output in zip(keys, outputs))
+    return StreamingResponse(frames, media_type='application/octet-stream', headers=headers)
 
 @rRouter.get("/reduction/nearby")
-def nearbyData(center: int):
-    tensors = []
-    NeuralStorage.retrieve()
+async def nearbyData(center: int):
+    nearby = await run_in_threadpool(storage().get_nearby, center)
+    if nearby is None:
+        raise HTTPException(status_code=404, detail=f"no neighbour stored for key {center}")
+    return {"key": nearby}
@@ -1,12 +1,22 @@
 # -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
 # source: rpc/Algorithm.proto
-# Protobuf Python Version: 4.25.1
+# Protobuf Python Version: 5.29.0
 """Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
 from google.protobuf import symbol_database as _symbol_database
 from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    5,
+    29,
+    0,
+    '',
+    'rpc/Algorithm.proto'
+)
 # @@protoc_insertion_point(imports)
 
 _sym_db = _symbol_database.Default()
@@ -14,17 +24,30 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13rpc/Algorithm.proto\x12\x1c\x63om.treevalue.soundRobot.rpc\"\x19\n\x08InputMsg\x12\r\n\x05input\x18\x01 \x01(\t\"\x19\n\x07\x45\x63hoMsg\x12\x0e\n\x06output\x18\x01 \x01(\t2d\n\tAlgorithm\x12W\n\x04\x45\x63ho\x12&.com.treevalue.soundRobot.rpc.InputMsg\x1a%.com.treevalue.soundRobot.rpc.EchoMsg\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13rpc/Algorithm.proto\x12\x17\x63om.treevalue.atsor.rpc\"\x1b\n\x08InputMsg\x12\x0f\n\x07message\x18\x01 \x01(\t\"\x1c\n\tOutputMsg\x12\x0f\n\x07message\x18\x01 \x01(\t\"4\n\x06Tensor\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\r\n\x05shape\x18\x02 \x03(\x03\x12\r\n\x05\x64type\x18\x03 \x01(\t\"L\n\x0cStoreRequest\x12\x0b\n\x03key\x18\x01 \x01(\x03\x12/\n\x06tensor\x18\x02 \x01(\x0b\x32\x1f.com.treevalue.atsor.rpc.Tensor\"\'\n\x08StoreAck\x12\x0c\n\x04keys\x18\x01 \x03(\x03\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"\x1e\n\x0fRetrieveRequest\x12\x0b\n\x03key\x18\x01 \x01(\x03\"K\n\x0bTensorEntry\x12\x0b\n\x03key\x18\x01 \x01(\x03\x12/\n\x06tensor\x18\x02 \x01(\x0b\x32\x1f.com.treevalue.atsor.rpc.Tensor\"G\n\x0cRangeRequest\x12\x10\n\x08key_from\x18\x01 \x01(\x03\x12\x16\n\x0ekey_to_exclude\x18\x02 \x01(\x03\x12\r\n\x05limit\x18\x03 \x01(\x05\x32\xd0\x03\n\tAlgorithm\x12O\n\x04\x45\x63ho\x12!.com.treevalue.atsor.rpc.InputMsg\x1a\".com.treevalue.atsor.rpc.OutputMsg\"\x00\x12S\n\x05Store\x12%.com.treevalue.atsor.rpc.StoreRequest\x1a!.com.treevalue.atsor.rpc.StoreAck\"\x00\x12\\\n\x08Retrieve\x12(.com.treevalue.atsor.rpc.RetrieveRequest\x1a$.com.treevalue.atsor.rpc.TensorEntry\"\x00\x12`\n\rRetrieveRange\x12%.com.treevalue.atsor.rpc.RangeRequest\x1a$.com.treevalue.atsor.rpc.TensorEntry\"\x00\x30\x01\x12]\n\x0bStreamStore\x12%.com.treevalue.atsor.rpc.StoreRequest\x1a!.com.treevalue.atsor.rpc.StoreAck\"\x00(\x01\x30\x01\x42\x02P\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'rpc.Algorithm_pb2', _globals)
-if _descriptor._USE_C_DESCRIPTORS == False:
-  DESCRIPTOR._options = None
-  _globals['_INPUTMSG']._serialized_start=53
-  _globals['_INPUTMSG']._serialized_end=78
-  _globals['_ECHOMSG']._serialized_start=80
-  _globals['_ECHOMSG']._serialized_end=105
-  _globals['_ALGORITHM']._serialized_start=107
-  _globals['_ALGORITHM']._serialized_end=207
+if not _descriptor._USE_C_DESCRIPTORS:
+  _globals['DESCRIPTOR']._loaded_options = None
+  _globals['DESCRIPTOR']._serialized_options = b'P\001'
+  _globals['_INPUTMSG']._serialized_start=48
+  _globals['_INPUTMSG']._serialized_end=75
+  _globals['_OUTPUTMSG']._serialized_start=77
+  _globals['_OUTPUTMSG']._serialized_end=105
+  _globals['_TENSOR']._serialized_start=107
+  _globals['_TENSOR']._serialized_end=159
+  _globals['_STOREREQUEST']._serialized_start=161
+  _globals['_STOREREQUEST']._serialized_end=237
+  _globals['_STOREACK']._serialized_start=239
+  _globals['_STOREACK']._serialized_end=278
+  _globals['_RETRIEVEREQUEST']._serialized_start=280
+  _globals['_RETRIEVEREQUEST']._serialized_end=310
+  _globals['_TENSORENTRY']._serialized_start=312
+  _globals['_TENSORENTRY']._serialized_end=387
+  _globals['_RANGEREQUEST']._serialized_start=389
+  _globals['_RANGEREQUEST']._serialized_end=460
+  _globals['_ALGORITHM']._serialized_start=463
+  _globals['_ALGORITHM']._serialized_end=927
 # @@protoc_insertion_point(module_scope)
@@ -1,9 +1,29 @@
 # Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
 """Client and server classes corresponding to protobuf-defined services."""
 import grpc
+import warnings
 
 from rpc import Algorithm_pb2 as rpc_dot_Algorithm__pb2
 
+GRPC_GENERATED_VERSION = '1.71.2'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + f' but the generated code in rpc/Algorithm_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
 
 class AlgorithmStub(object):
     """Missing associated documentation comment in .proto file."""
@@ -15,10 +35,30 @@ class AlgorithmStub(object):
             channel: A grpc.Channel.
         """
         self.Echo = channel.unary_unary(
-                '/com.treevalue.soundRobot.rpc.Algorithm/Echo',
+                '/com.treevalue.atsor.rpc.Algorithm/Echo',
                 request_serializer=rpc_dot_Algorithm__pb2.InputMsg.SerializeToString,
-                response_deserializer=rpc_dot_Algorithm__pb2.EchoMsg.FromString,
-                )
+                response_deserializer=rpc_dot_Algorithm__pb2.OutputMsg.FromString,
+                _registered_method=True)
+        self.Store = channel.unary_unary(
+                '/com.treevalue.atsor.rpc.Algorithm/Store',
+                request_serializer=rpc_dot_Algorithm__pb2.StoreRequest.SerializeToString,
+                response_deserializer=rpc_dot_Algorithm__pb2.StoreAck.FromString,
+                _registered_method=True)
+        self.Retrieve = channel.unary_unary(
+                '/com.treevalue.atsor.rpc.Algorithm/Retrieve',
+                request_serializer=rpc_dot_Algorithm__pb2.RetrieveRequest.SerializeToString,
+                response_deserializer=rpc_dot_Algorithm__pb2.TensorEntry.FromString,
+                _registered_method=True)
+        self.RetrieveRange = channel.unary_stream(
+                '/com.treevalue.atsor.rpc.Algorithm/RetrieveRange',
+                request_serializer=rpc_dot_Algorithm__pb2.RangeRequest.SerializeToString,
+                response_deserializer=rpc_dot_Algorithm__pb2.TensorEntry.FromString,
+                _registered_method=True)
+        self.StreamStore = channel.stream_stream(
+                '/com.treevalue.atsor.rpc.Algorithm/StreamStore',
+                request_serializer=rpc_dot_Algorithm__pb2.StoreRequest.SerializeToString,
+                response_deserializer=rpc_dot_Algorithm__pb2.StoreAck.FromString,
+                _registered_method=True)
 
 
 class AlgorithmServicer(object):
@@ -30,18 +70,63 @@ class AlgorithmServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Store(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Retrieve(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def RetrieveRange(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamStore(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AlgorithmServicer_to_server(servicer, server):
     rpc_method_handlers = {
             'Echo': grpc.unary_unary_rpc_method_handler(
                     servicer.Echo,
                     request_deserializer=rpc_dot_Algorithm__pb2.InputMsg.FromString,
-                    response_serializer=rpc_dot_Algorithm__pb2.EchoMsg.SerializeToString,
+                    response_serializer=rpc_dot_Algorithm__pb2.OutputMsg.SerializeToString,
+            ),
+            'Store': grpc.unary_unary_rpc_method_handler(
+                    servicer.Store,
+                    request_deserializer=rpc_dot_Algorithm__pb2.StoreRequest.FromString,
+                    response_serializer=rpc_dot_Algorithm__pb2.StoreAck.SerializeToString,
+            ),
+            'Retrieve': grpc.unary_unary_rpc_method_handler(
+                    servicer.Retrieve,
+                    request_deserializer=rpc_dot_Algorithm__pb2.RetrieveRequest.FromString,
+                    response_serializer=rpc_dot_Algorithm__pb2.TensorEntry.SerializeToString,
+            ),
+            'RetrieveRange': grpc.unary_stream_rpc_method_handler(
+                    servicer.RetrieveRange,
+                    request_deserializer=rpc_dot_Algorithm__pb2.RangeRequest.FromString,
+                    response_serializer=rpc_dot_Algorithm__pb2.TensorEntry.SerializeToString,
+            ),
+            'StreamStore': grpc.stream_stream_rpc_method_handler(
+                    servicer.StreamStore,
+                    request_deserializer=rpc_dot_Algorithm__pb2.StoreRequest.FromString,
+                    response_serializer=rpc_dot_Algorithm__pb2.StoreAck.SerializeToString,
             ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
-            'com.treevalue.soundRobot.rpc.Algorithm', rpc_method_handlers)
+            'com.treevalue.atsor.rpc.Algorithm', rpc_method_handlers)
     server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('com.treevalue.atsor.rpc.Algorithm', rpc_method_handlers)
 
 
  # This class is part of an EXPERIMENTAL API.
@@ -59,8 +144,126 @@ class Algorithm(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/com.treevalue.soundRobot.rpc.Algorithm/Echo',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/com.treevalue.atsor.rpc.Algorithm/Echo',
             rpc_dot_Algorithm__pb2.InputMsg.SerializeToString,
-            rpc_dot_Algorithm__pb2.EchoMsg.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            rpc_dot_Algorithm__pb2.OutputMsg.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Store(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/com.treevalue.atsor.rpc.Algorithm/Store',
+            rpc_dot_Algorithm__pb2.StoreRequest.SerializeToString,
+            rpc_dot_Algorithm__pb2.StoreAck.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Retrieve(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/com.treevalue.atsor.rpc.Algorithm/Retrieve',
+            rpc_dot_Algorithm__pb2.RetrieveRequest.SerializeToString,
+            rpc_dot_Algorithm__pb2.TensorEntry.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def RetrieveRange(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/com.treevalue.atsor.rpc.Algorithm/RetrieveRange',
+            rpc_dot_Algorithm__pb2.RangeRequest.SerializeToString,
+            rpc_dot_Algorithm__pb2.TensorEntry.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamStore(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/com.treevalue.atsor.rpc.Algorithm/StreamStore',
+            rpc_dot_Algorithm__pb2.StoreRequest.SerializeToString,
+            rpc_dot_Algorithm__pb2.StoreAck.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
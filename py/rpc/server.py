@@ -0,0 +1,155 @@
+import asyncio
+import logging
+
+import grpc
+import numpy as np
+
+from neuronalMemory.neuronalMemory import NeuralStorage
+from neuronalMemory.task import TaskQueue
+from remote.binaryTensor import decode_raw
+from rpc import Algorithm_pb2, Algorithm_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+PORT = 50051
+INGEST_QUEUE_SIZE = 1024
+# most StreamStore items trained as one store_many task
+STREAM_BATCH = 256
+# seconds a stream waits before retrying a store the full ingest queue refused
+STREAM_RETRY_SECONDS = 0.05
+MAX_RANGE_LIMIT = 4096
+# trailing metadata of a RetrieveRange page that does not exhaust the range
+NEXT_KEY_METADATA = 'x-next-key'
+
+
+def _decode_tensor(tensor):
+    return decode_raw(tensor.data, tensor.shape, tensor.dtype or 'float32').reshape(-1)
+
+
+def _encode_tensor(array):
+    array = np.ascontiguousarray(array)
+    return Algorithm_pb2.Tensor(data=array.tobytes(), shape=array.shape, dtype=array.dtype.name)
+
+
+async def _ack(keys, future):
+    # waits for the store task, a StoreAck only reports keys actually stored
+    await asyncio.wait([future])
+    if future.cancelled():
+        return Algorithm_pb2.StoreAck(keys=keys, error="dropped")
+    if future.exception() is not None:
+        return Algorithm_pb2.StoreAck(keys=keys, error=str(future.exception()))
+    return Algorithm_pb2.StoreAck(keys=keys)
+
+
+class AlgorithmService(Algorithm_pb2_grpc.AlgorithmServicer):
+    """
+    Tensor service backed by the NeuralStorage singleton. Stores go through
+    the TaskQueue like the REST endpoints and are acked once stored, a full
+    queue answers RESOURCE_EXHAUSTED; StreamStore instead waits, so HTTP/2 flow control
+    slows the client down. Retrieved memories are uint8 tensors.
+    """
+
+    async def Echo(self, request, context):
+        return Algorithm_pb2.OutputMsg(message='echo: ' + request.message)
+
+    async def Store(self, request, context):
+        try:
+            tensor = _decode_tensor(request.tensor)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        try:
+            future = await TaskQueue().add(NeuralStorage().store, request.key, tensor, coalesce_key=request.key)
+        except asyncio.QueueFull:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "ingest queue is full")
+        return await _ack([request.key], future)
+
+    async def Retrieve(self, request, context):
+        output = await asyncio.to_thread(NeuralStorage().retrieve, request.key)
+        if output is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"key {request.key} is not stored")
+        return Algorithm_pb2.TensorEntry(key=request.key, tensor=_encode_tensor(np.frombuffer(output, np.uint8)))
+
+    async def RetrieveRange(self, request, context):
+        """
+        Streams the keys in [key_from, key_to_exclude), at most limit of them
+        (capped at MAX_RANGE_LIMIT). Like the X-Next-Key header of
+        /reduction/get, the key to request the next page from is sent as
+        NEXT_KEY_METADATA trailing metadata when the range continues.
+        """
+        limit = min(request.limit or MAX_RANGE_LIMIT, MAX_RANGE_LIMIT)
+        keys, outputs, next_key = await asyncio.to_thread(NeuralStorage().retrieve_range, request.key_from,
+                                                          request.key_to_exclude, limit)
+        if next_key is not None:
+            context.set_trailing_metadata(((NEXT_KEY_METADATA, str(next_key)),))
+        for key, output in zip(keys, outputs):
+            yield Algorithm_pb2.TensorEntry(key=int(key), tensor=_encode_tensor(output))
+
+    async def StreamStore(self, request_iterator, context):
+        """
+        Items that arrive while the previous batch trains are stored together
+        as one store_many task, up to STREAM_BATCH; one StoreAck is sent per
+        batch once it is stored, or with error set if it failed. Items with a
+        malformed tensor are acked with an error of their own.
+        """
+        received = asyncio.Queue(maxsize=STREAM_BATCH)
+        receiver = asyncio.create_task(self._receive(request_iterator, received))
+        try:
+            done = False
+            while not done:
+                batch = [await received.get()]
+                while len(batch) < STREAM_BATCH and not received.empty():
+                    batch.append(received.get_nowait())
+                if batch[-1] is None:
+                    batch.pop()
+                    done = True
+                items = [item for item in batch if not isinstance(item, Algorithm_pb2.StoreAck)]
+                for item in batch:
+                    if isinstance(item, Algorithm_pb2.StoreAck):
+                        yield item
+                if items:
+                    yield await self._store_batch(items)
+            await receiver
+        finally:
+            receiver.cancel()
+
+    async def _receive(self, request_iterator, received):
+        try:
+            async for request in request_iterator:
+                try:
+                    await received.put((request.key, _decode_tensor(request.tensor)))
+                except ValueError as e:
+                    await received.put(Algorithm_pb2.StoreAck(keys=[request.key], error=str(e)))
+        finally:
+            await received.put(None)
+
+    async def _store_batch(self, items):
+        keys = [key for key, _ in items]
+        tensors = [tensor for _, tensor in items]
+        while True:
+            try:
+                future = await TaskQueue().add(NeuralStorage().store_many, keys, tensors)
+                break
+            except asyncio.QueueFull:
+                await asyncio.sleep(STREAM_RETRY_SECONDS)
+        return await _ack(keys, future)
+
+
+async def serve(port=PORT):
+    NeuralStorage()
+    task_queue = TaskQueue(max_size=INGEST_QUEUE_SIZE, workers=1, executor='thread', overflow='reject')
+    await task_queue.start()
+    server = grpc.aio.server()
+    Algorithm_pb2_grpc.add_AlgorithmServicer_to_server(AlgorithmService(), server)
+    server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+    logger.info(f"gRPC server listening on port {port}")
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(grace=5)
+        await task_queue.shutdown(drain=True)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve())